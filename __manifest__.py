@@ -20,6 +20,12 @@ Adds a Mollie App menu in Odoo 18.
 
         # ✅ IMPORTANT: action/view file must load BEFORE menu
         'views/mollie_dashboard_views.xml',
+        'views/mollie_renewal_summary_views.xml',
+        'views/mollie_webhook_event_views.xml',
+        'views/mollie_api_metric_views.xml',
+        'views/mollie_charge_run_views.xml',
+        'views/mollie_mandate_views.xml',
+        'views/mollie_payment_event_views.xml',
         'views/mollie_menu.xml',
 
         'views/res_partner_views.xml',
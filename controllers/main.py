@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 from odoo import http
 from odoo.http import request
-import requests
+import hmac
 import logging
 
+from ..tools.mollie_client import MollieAPIError
+from ..tools.mollie_metrics import metrics
+
 _logger = logging.getLogger(__name__)
 
 
@@ -20,28 +23,22 @@ class MollieRecurringController(http.Controller):
             # Mollie expects quick 200 responses; we return ok-style response
             return {"status": "error", "message": "no id"}
 
-        mollie_provider = request.env['payment.provider'].sudo().search([('code', '=', 'mollie')], limit=1)
-        api_key = mollie_provider.mollie_api_key if mollie_provider else False
-        if not api_key:
+        providers = request.env['payment.provider'].sudo()._mollie_recurring_providers()
+        if not providers:
             _logger.error("Webhook Mollie API key missing!")
             return {"status": "error", "message": "api key missing"}
 
-        headers = {"Authorization": f"Bearer {api_key}"}
+        PaymentCache = request.env['mollie.payment.cache'].sudo()
+        PaymentCache._invalidate([payment_id])
         try:
-            resp = requests.get(
-                f"https://api.mollie.com/v2/payments/{payment_id}",
-                headers=headers,
-                timeout=15
-            )
+            payment_data = PaymentCache._get_payment_from_providers(providers, payment_id)
+        except MollieAPIError as e:
+            _logger.error("Webhook payment fetch failed: %s", e)
+            return {"status": "error", "message": "fetch failed"}
         except Exception as e:
             _logger.exception("Webhook payment fetch exception: %s", e)
             return {"status": "error", "message": "fetch exception"}
 
-        if resp.status_code != 200:
-            _logger.error("Webhook payment fetch failed: %s", resp.text)
-            return {"status": "error", "message": "fetch failed"}
-
-        payment_data = resp.json() if resp.content else {}
         cust = payment_data.get("customerId")
         mand = payment_data.get("_links", {}).get("mandate", {}).get("href", "").split("/")[-1]
         status = payment_data.get("status")
@@ -79,62 +76,26 @@ class MollieRecurringController(http.Controller):
             _logger.warning("Subscription webhook called but no payment id found.")
             return "ok"
 
-        mollie_provider = request.env['payment.provider'].sudo().search([('code', '=', 'mollie')], limit=1)
-        api_key = mollie_provider.mollie_api_key if mollie_provider else False
-        if not api_key:
-            _logger.error("Subscription webhook: Mollie API key missing!")
-            return "ok"
-
-        # Always verify current status from Mollie (do not trust webhook payload)
-        headers = {"Authorization": f"Bearer {api_key}"}
-        try:
-            resp = requests.get(
-                f"https://api.mollie.com/v2/payments/{payment_id}",
-                headers=headers,
-                timeout=15
-            )
-        except Exception as e:
-            _logger.exception("Subscription webhook Mollie fetch exception: %s", e)
-            return "ok"
-
-        if resp.status_code != 200:
-            _logger.error("Subscription webhook Mollie fetch failed: %s", resp.text)
-            return "ok"
-
-        payment_data = resp.json() if resp.content else {}
-        status = payment_data.get("status")
-        metadata = payment_data.get("metadata") or {}
-        meta_order_id = metadata.get("order_id")
-
-        _logger.info("Subscription webhook payment_id=%s status=%s metadata=%s", payment_id, status, metadata)
+        # Only queue the notification: the inbox cron verifies the status with Mollie
+        # (do not trust webhook payload) and applies accounting, outside of this request.
+        request.env['mollie.webhook.event'].sudo()._enqueue(payment_id)
+        return "ok"
 
-        # 1) Primary match: your existing approach (last_payment_id)
-        order = request.env['sale.order'].sudo().search([('last_payment_id', '=', payment_id)], limit=1)
-
-        # 2) Fallback match: Mollie metadata order_id (VERY helpful)
-        if not order and meta_order_id:
-            try:
-                order = request.env['sale.order'].sudo().browse(int(meta_order_id))
-                if not order.exists():
-                    order = False
-            except Exception:
-                order = False
-
-        if not order:
-            _logger.warning("No order found for Mollie payment ID %s", payment_id)
-            return "ok"
 
-        # Refresh status + apply accounting if paid (your method handles this)
-        _logger.info("Processing subscription webhook for order %s and payment %s", order.name, payment_id)
-
-        # If the order.last_payment_id is not set (rare case), set it so refresh works
-        if not order.last_payment_id:
-            order.sudo().write({"last_payment_id": payment_id})
-
-        # This method:
-        # - fetches latest payment status from Mollie
-        # - writes mollie_last_payment_status / paid flags
-        # - if paid => calls _process_mollie_payment_success()
-        order.action_refresh_last_mollie_payment_status()
-
-        return "ok"
\ No newline at end of file
+    @http.route('/mollie/metrics', type='http', auth="public", csrf=False, methods=['GET'])
+    def mollie_metrics(self, token=None, **kwargs):
+        """
+        Mollie API call metrics of the serving worker, in Prometheus text format.
+        Protected by the mollie_recurring_payments.metrics_token system parameter,
+        passed as ?token=... or as a Bearer token; disabled when not set.
+        """
+        expected = request.env['ir.config_parameter'].sudo().get_param('mollie_recurring_payments.metrics_token')
+        auth_header = request.httprequest.headers.get('Authorization') or ''
+        provided = token or (auth_header[7:] if auth_header.startswith('Bearer ') else '')
+        if not expected or not provided or not hmac.compare_digest(expected, provided):
+            return request.not_found()
+
+        return request.make_response(
+            metrics.render_prometheus(),
+            headers=[('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')],
+        )
\ No newline at end of file
@@ -1,6 +1,17 @@
+from . import mollie_mandate
 from . import res_partner
 from . import sale_order
+from . import sale_order_line
 from . import subscription_cron
+from . import mollie_webhook_event
+from . import mollie_payment_cache
+from . import mollie_payment_event
+from . import mollie_api_metric
+from . import mollie_rate_limit
+from . import mollie_charge_run
+from . import mollie_charge_retry
+from . import mollie_renewal_summary
+from . import payment_provider
 from . import payment_transaction
 from . import account_move
 from . import account_payment
\ No newline at end of file
@@ -5,18 +5,49 @@ from odoo import models, fields, api
 class AccountMove(models.Model):
     _inherit = "account.move"
 
+    mollie_payment_id = fields.Char(
+        string="Mollie Payment ID",
+        readonly=True,
+        copy=False,
+        index=True,
+        help="Mollie payment that charged this subscription renewal invoice.",
+    )
+    # Status of that payment only: set by _mollie_flush_invoice_status(), not
+    # recomputed for every invoice of the order.
     mollie_last_payment_status = fields.Char(
         string="Mollie Last Payment Status",
-        compute="_compute_mollie_from_so",
-        store=True,
-        index=True
+        readonly=True,
+        copy=False,
+        index=True,
     )
 
-    @api.depends('invoice_line_ids.sale_line_ids.order_id.mollie_last_payment_status')
-    def _compute_mollie_from_so(self):
-        for move in self:
-            move.mollie_last_payment_status = False
-            sale_orders = move.mapped('invoice_line_ids.sale_line_ids.order_id')
-            if sale_orders:
-                so = sale_orders[:1]
-                move.mollie_last_payment_status = so.mollie_last_payment_status
\ No newline at end of file
+    @api.model
+    def _mollie_queue_invoice_status(self, status_by_payment):
+        """
+        Queue ``{payment_id: status}`` for the invoices linked to those payments.
+        Applied in one statement when the transaction commits (or on an explicit flush).
+        """
+        if not status_by_payment:
+            return
+        data = self.env.cr.precommit.data
+        if "mollie_invoice_status" not in data:
+            data["mollie_invoice_status"] = {}
+            self.env.cr.precommit.add(self._mollie_flush_invoice_status)
+        data["mollie_invoice_status"].update(status_by_payment)
+
+    @api.model
+    def _mollie_flush_invoice_status(self):
+        status_by_payment = self.env.cr.precommit.data.pop("mollie_invoice_status", None)
+        if not status_by_payment:
+            return
+        self.env.cr.execute(
+            f"""
+            UPDATE account_move AS move
+               SET mollie_last_payment_status = status.value
+              FROM (VALUES {", ".join(["(%s, %s)"] * len(status_by_payment))}) AS status (payment_id, value)
+             WHERE move.mollie_payment_id = status.payment_id
+               AND move.mollie_last_payment_status IS DISTINCT FROM status.value
+            """,
+            [param for item in status_by_payment.items() for param in item],
+        )
+        self.env["account.move"].invalidate_model(["mollie_last_payment_status"])
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import os
+
+from odoo import models, api, fields
+
+from ..tools.mollie_metrics import metrics
+
+
+class MollieApiMetric(models.TransientModel):
+    """Snapshot of the Mollie call metrics of the worker serving the request."""
+
+    _name = "mollie.api.metric"
+    _description = "Mollie API Metrics"
+    _order = "requests desc"
+
+    endpoint = fields.Char(string="Endpoint", readonly=True)
+    requests = fields.Integer(string="Requests", readonly=True)
+    avg_latency = fields.Float(string="Avg Latency (s)", digits=(16, 3), readonly=True)
+    p50_latency = fields.Float(string="p50 Latency (s)", digits=(16, 3), readonly=True)
+    p95_latency = fields.Float(string="p95 Latency (s)", digits=(16, 3), readonly=True)
+    status_codes = fields.Char(string="Status Codes", readonly=True)
+    rate_limited = fields.Integer(string="429s", readonly=True)
+    retries = fields.Integer(string="Retries", readonly=True)
+    network_errors = fields.Integer(string="Network Errors", readonly=True)
+    backoff_seconds = fields.Float(string="Backoff (s)", digits=(16, 1), readonly=True)
+    limiter_rejections = fields.Integer(string="Limiter Rejections", readonly=True)
+    worker_pid = fields.Integer(string="Worker PID", readonly=True)
+
+    @api.model
+    def action_open_summary(self):
+        pid = os.getpid()
+        records = self.create([dict(row, worker_pid=pid) for row in metrics.summary()])
+        return {
+            "type": "ir.actions.act_window",
+            "name": "Mollie API Metrics",
+            "res_model": self._name,
+            "view_mode": "list",
+            "domain": [("id", "in", records.ids)],
+            "target": "current",
+        }
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+from datetime import timedelta
+
+from odoo import models, api, fields
+
+from markupsafe import Markup
+
+_logger = logging.getLogger(__name__)
+
+RETRY_REASONS = [
+    ("insufficient_funds", "Insufficient Funds"),
+    ("mandate_revoked", "Mandate Revoked"),
+    ("rate_limited", "Rate Limited"),
+    ("server_error", "Mollie Server Error"),
+    ("other", "Other Failure"),
+]
+
+# Hours after the failure at which each retry is due, per reason. Overridden by the
+# mollie_recurring_payments.retry_schedule_<reason> parameters ("72,168,336").
+# Revoked mandates are never retried.
+RETRY_SCHEDULES = {
+    "insufficient_funds": (72, 168, 336),
+    "mandate_revoked": (),
+    "rate_limited": (1, 2, 4, 8),
+    "server_error": (1, 6, 24),
+    "other": (24, 72),
+}
+
+# Queue order among due retries: lower runs first
+RETRY_PRIORITIES = {
+    "rate_limited": 10,
+    "server_error": 20,
+    "insufficient_funds": 30,
+    "other": 40,
+    "mandate_revoked": 50,
+}
+
+# SEPA / card failure codes reported by Mollie on failed payments
+INSUFFICIENT_FUNDS_CODES = {"AM04", "insufficient_funds"}
+MANDATE_REVOKED_CODES = {"MD01", "MD06", "MD07", "AC04", "AC06", "AC13", "SL01"}
+
+# Delay before looking again while a charge run is sending the day's renewals
+RETRY_BURST_DELAY = timedelta(minutes=30)
+
+
+class MollieChargeRetry(models.Model):
+    """
+    Queue of retries for failed recurring charges.
+
+    A failed charge run line (creation refused by Mollie, or payment reported
+    failed afterwards) queues a retry, due after the delay configured for its
+    failure reason. Due times are spread over ``retry_spread_minutes`` per
+    order so that retries do not arrive together. Charge slots only use part
+    of the rate budget; when slots are disabled, the retry cron waits while a
+    charge run is still sending the day's renewals. Retries of revoked
+    mandates are dropped without calling Mollie.
+    """
+
+    _name = "mollie.charge.retry"
+    _description = "Mollie Charge Retry"
+    _order = "priority, due_at, id"
+
+    line_id = fields.Many2one(
+        "mollie.charge.run.line", string="Charge", required=True, readonly=True, ondelete="cascade", index=True
+    )
+    order_id = fields.Many2one(related="line_id.order_id", string="Order", store=True, index=True)
+    partner_id = fields.Many2one(related="line_id.order_id.partner_id", string="Customer")
+    reason = fields.Selection(RETRY_REASONS, string="Reason", required=True, readonly=True)
+    attempt = fields.Integer(string="Attempt", required=True, readonly=True)
+    priority = fields.Integer(string="Priority", readonly=True)
+    due_at = fields.Datetime(string="Due At", readonly=True, index=True)
+    state = fields.Selection(
+        [
+            ("queued", "Queued"),
+            ("sending", "Sending"),
+            ("done", "Charged"),
+            ("failed", "Failed"),
+            ("dropped", "Dropped"),
+            ("exhausted", "Exhausted"),
+        ],
+        string="Status",
+        default="queued",
+        required=True,
+        readonly=True,
+        index=True,
+    )
+    failed_payment_id = fields.Char(string="Failed Payment ID", readonly=True)
+    payment_id = fields.Char(string="Retry Payment ID", readonly=True)
+    error = fields.Text(string="Error", readonly=True)
+
+    # -------------------------------------------------------------------------
+    # Settings
+    # -------------------------------------------------------------------------
+    @api.model
+    def _get_schedule(self, reason):
+        value = self.env["ir.config_parameter"].sudo().get_param(f"mollie_recurring_payments.retry_schedule_{reason}")
+        if value is None or value is False:
+            return RETRY_SCHEDULES.get(reason, ())
+        try:
+            return tuple(float(hours) for hours in value.split(",") if hours.strip())
+        except ValueError:
+            _logger.warning("Invalid Mollie retry schedule for %s: %r", reason, value)
+            return RETRY_SCHEDULES.get(reason, ())
+
+    @api.model
+    def _get_int_param(self, key, default):
+        try:
+            return max(int(self.env["ir.config_parameter"].sudo().get_param(
+                f"mollie_recurring_payments.{key}", default
+            )), 0)
+        except (TypeError, ValueError):
+            return default
+
+    @api.model
+    def _classify_failure(self, data, status_code=None):
+        """
+        Retry reason of a refused charge or failed payment, from Mollie's answer and,
+        for a refused creation, the HTTP ``status_code`` of the response.
+        """
+        if status_code == 429:
+            return "rate_limited"
+        if status_code and status_code >= 500:
+            return "server_error"
+        data = data or {}
+        details = data.get("details") or {}
+        codes = {details.get("bankReasonCode"), details.get("failureReason")}
+        if codes & MANDATE_REVOKED_CODES:
+            return "mandate_revoked"
+        if codes & INSUFFICIENT_FUNDS_CODES:
+            return "insufficient_funds"
+        if data.get("field") == "mandateId" or "mandate" in str(data.get("detail") or "").lower():
+            return "mandate_revoked"
+        return "other"
+
+    # -------------------------------------------------------------------------
+    # Scheduling
+    # -------------------------------------------------------------------------
+    @api.model
+    def _schedule(self, line, reason, failed_payment_id=None, error=None):
+        """Queue the next retry of the charge of ``line`` after a failure for ``reason``."""
+        if self.search_count([("line_id", "=", line.id), ("state", "=", "queued")], limit=1):
+            return self.browse()
+        attempt = self.search_count([("line_id", "=", line.id)]) + 1
+        schedule = self._get_schedule(reason)
+        vals = {
+            "line_id": line.id,
+            "reason": reason,
+            "attempt": attempt,
+            "priority": RETRY_PRIORITIES.get(reason, 40),
+            "failed_payment_id": failed_payment_id,
+            "error": error,
+        }
+        order = line.order_id
+        ChargeRun = self.env["mollie.charge.run"]
+        if reason == "mandate_revoked":
+            ChargeRun._queue_note(order, Markup("⛔ Mollie mandate revoked: the failed renewal charge is not retried."))
+            return self.create(dict(vals, state="dropped"))
+        if attempt > len(schedule):
+            ChargeRun._queue_note(
+                order, Markup("⛔ Mollie renewal charge still failing after %s retries, giving up.") % (attempt - 1)
+            )
+            return self.create(dict(vals, state="exhausted"))
+
+        due_at = self._spread_due_at(line, attempt, timedelta(hours=schedule[attempt - 1]))
+        _logger.info("🔁 Mollie retry %d of %s (%s) due at %s", attempt, order.name, reason, due_at)
+        return self.create(dict(vals, due_at=due_at))
+
+    @api.model
+    def _spread_due_at(self, line, attempt, delay):
+        """``now + delay``, shifted by a stable per-order offset within the spread window."""
+        spread = self._get_int_param("retry_spread_minutes", 240)
+        offset = 0
+        if spread:
+            digest = hashlib.sha256(f"{line.order_id.id}:{attempt}".encode()).hexdigest()
+            offset = int(digest[:8], 16) % spread
+        return fields.Datetime.now() + delay + timedelta(minutes=offset)
+
+    @api.model
+    def _schedule_for_failed_payment(self, payment_id, data):
+        """Queue a retry for the charge whose Mollie payment ``payment_id`` failed."""
+        line = self.env["mollie.charge.run.line"].search([("payment_id", "=", payment_id)], limit=1)
+        if not line:
+            return self.browse()
+        error = str(data.get("details") or data.get("status"))
+        return self._schedule(line, self._classify_failure(data), failed_payment_id=payment_id, error=error)
+
+    # -------------------------------------------------------------------------
+    # Cron
+    # -------------------------------------------------------------------------
+    @api.model
+    def _cron_process_retries(self):
+        """Send one batch of due retries through the charge run lines they belong to."""
+        ChargeRun = self.env["mollie.charge.run"]
+        now = fields.Datetime.now()
+        cron = self.env.ref("mollie_recurring_payments.cron_mollie_retry_charges", raise_if_not_found=False)
+
+        # Never add to the main charge burst (slotted runs leave part of the budget to retries)
+        burst = not ChargeRun._get_param("charge_slot_minutes", 15)
+        if burst and ChargeRun.search_count([("state", "=", "running"), ("run_date", "=", fields.Date.today())], limit=1):
+            _logger.info("⏳ Mollie charge run in progress, retries wait")
+            if cron:
+                cron.sudo()._trigger(at=now + RETRY_BURST_DELAY)
+            return True
+
+        # Retries interrupted while sending go first: their Idempotency-Key makes them safe to resend
+        retries = self.search([("state", "=", "sending")])
+        retries |= self.search(
+            [("state", "=", "queued"), ("due_at", "<=", now)],
+            limit=self._get_int_param("retry_batch_size", 50) or 50,
+        )
+        if not retries:
+            return True
+
+        # Revoked mandates are dropped without calling the API
+        revoked = retries.filtered(lambda retry: retry.order_id.mollie_mandate_ref_id.status != "valid")
+        revoked.write({"state": "dropped", "error": "No valid Mollie mandate"})
+        settled = (retries - revoked).filtered(lambda retry: retry._is_settled())
+        settled.write({"state": "dropped", "error": "Invoice already paid"})
+        todo = retries - revoked - settled
+
+        todo.write({"state": "sending"})
+        for retry in todo:
+            line = retry.line_id
+            if line.state != "pending":
+                line.write({
+                    "state": "pending",
+                    "idempotency_key": ChargeRun._charge_key(line.order_id.id, line.run_id.run_date, attempt=retry.attempt),
+                    "attempts": 0,
+                    "error": False,
+                })
+        lines = todo.line_id
+        paused = not lines._send()
+        lines.filtered(lambda line: line.state == "sent")._invoice()
+        ChargeRun._notify()
+
+        for retry in todo:
+            line = retry.line_id
+            if line.state in ("sent", "confirmed"):
+                retry.write({"state": "done", "payment_id": line.payment_id})
+            elif line.state == "pending":
+                # Postponed by the rate limit or a transient error: same attempt, later,
+                # now waiting (and queued) on the schedule of that reason
+                reason = "rate_limited" if paused else "server_error"
+                line.write({"state": "failed"})
+                retry.write({
+                    "state": "queued",
+                    "reason": reason,
+                    "priority": RETRY_PRIORITIES[reason],
+                    "due_at": self._spread_due_at(
+                        line, retry.attempt, timedelta(hours=(self._get_schedule(reason) or (1,))[0])
+                    ),
+                })
+            elif line.state == "skipped":
+                retry.write({"state": "dropped", "error": line.error})
+            else:
+                # The failure queued the next retry (if any is left)
+                retry.write({"state": "failed", "error": line.error})
+        ChargeRun._checkpoint()
+
+        remaining = self.search_count([("state", "=", "queued"), ("due_at", "<=", fields.Datetime.now())])
+        _logger.info("🔁 Mollie retries: %d processed, %d due", len(retries), remaining)
+        self.env["ir.cron"]._notify_progress(done=len(retries), remaining=0 if paused else remaining)
+        return True
+
+    def _is_settled(self):
+        """The renewal invoice of the failed payment got paid in the meantime."""
+        self.ensure_one()
+        if not self.failed_payment_id:
+            return False
+        invoice = self.env["account.move"].search([("mollie_payment_id", "=", self.failed_payment_id)], limit=1)
+        return invoice.payment_state in ("paid", "in_payment")
@@ -0,0 +1,609 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import itertools
+import logging
+import math
+import threading
+from datetime import timedelta
+
+from odoo import models, api, fields
+from odoo.tools import split_every
+
+from markupsafe import Markup
+import requests
+
+from ..tools.mollie_client import MollieAPIError, MollieRateLimited, PRIORITY_BACKGROUND
+from ..tools.mollie_dispatcher import MollieDispatcher
+from ..tools.mollie_metrics import timed_stage
+
+_logger = logging.getLogger(__name__)
+
+# Charges answered with a 5xx / network error are retried by later passes up to this many times
+CHARGE_MAX_ATTEMPTS = 3
+# Mollie only replays an Idempotency-Key for a limited time: charges left in flight for
+# longer are looked up on Mollie before being sent again
+IDEMPOTENCY_KEY_TTL = timedelta(minutes=50)
+# Delay before resuming a run paused by the Mollie rate limit
+CHARGE_RUN_RESUME_DELAY = timedelta(minutes=5)
+# Lines created (and committed) together when a run starts
+LINE_CREATE_CHUNK_SIZE = 1000
+# Share of the Mollie rate budget a charge slot may use: the rest stays available
+# to retries, status refreshes and webhook verification running meanwhile
+CHARGE_SLOT_BUDGET_SHARE = 0.5
+
+
+class MollieChargeRun(models.Model):
+    """
+    Checkpointed charge run of one billing day: the single charge pipeline.
+
+    Every order due that day gets a line when the run starts. Lines move from
+    ``pending`` to ``sent`` (payment created on Mollie) to ``confirmed``
+    (renewal invoiced), or end as ``failed`` / ``skipped``. Lines are processed
+    in chunks, committed after each chunk, so an interrupted run resumes from
+    its pending and sent lines; the per-order Idempotency-Key makes a charge
+    that was in flight during the interruption safe to send again.
+
+    Each chunk goes through the same stages, timed in the Mollie metrics:
+    ``select`` (due orders become lines), ``screen`` (blocked, no longer due,
+    no mandate), ``charge`` (payments created on Mollie), ``persist`` (lines
+    and orders updated), ``invoice`` (renewal invoices) and ``notify``
+    (chatter notes, logged in one batch).
+    """
+
+    _name = "mollie.charge.run"
+    _description = "Mollie Charge Run"
+    _order = "run_date desc, id desc"
+
+    name = fields.Char(string="Name", compute="_compute_name", store=True)
+    run_date = fields.Date(string="Billing Date", required=True, readonly=True, index=True)
+    state = fields.Selection(
+        [("running", "Running"), ("done", "Done")],
+        string="Status",
+        default="running",
+        required=True,
+        readonly=True,
+        index=True,
+    )
+    started_at = fields.Datetime(string="Started At", default=fields.Datetime.now, readonly=True)
+    finished_at = fields.Datetime(string="Finished At", readonly=True)
+    line_ids = fields.One2many("mollie.charge.run.line", "run_id", string="Charges", readonly=True)
+    pending_count = fields.Integer(string="Pending", compute="_compute_counts")
+    sent_count = fields.Integer(string="Sent", compute="_compute_counts")
+    confirmed_count = fields.Integer(string="Confirmed", compute="_compute_counts")
+    failed_count = fields.Integer(string="Failed", compute="_compute_counts")
+    skipped_count = fields.Integer(string="Skipped", compute="_compute_counts")
+
+    _sql_constraints = [
+        ("run_date_uniq", "unique(run_date)", "There is a single Mollie charge run per billing date."),
+    ]
+
+    @api.depends("run_date")
+    def _compute_name(self):
+        for run in self:
+            run.name = f"Mollie charges {run.run_date}" if run.run_date else False
+
+    def _compute_counts(self):
+        counts = {
+            (run.id, state): count
+            for run, state, count in self.env["mollie.charge.run.line"]._read_group(
+                [("run_id", "in", self.ids)], ["run_id", "state"], ["__count"]
+            )
+        }
+        for run in self:
+            for state in ("pending", "sent", "confirmed", "failed", "skipped"):
+                run[f"{state}_count"] = counts.get((run.id, state), 0)
+
+    @api.model
+    def _auto_commit(self):
+        """Commit the work done so far (never inside tests)."""
+        if not getattr(threading.current_thread(), "testing", False):
+            self.env.cr.commit()
+
+    @api.model
+    def _checkpoint(self):
+        """
+        End of a chunk: commit it and empty the ORM cache, so that memory use and
+        lock duration stay those of one chunk whatever the size of the run.
+        """
+        self._auto_commit()
+        self.env.invalidate_all()
+
+    @api.model
+    def _charge_key(self, order_id, run_date, attempt=0):
+        """
+        Idempotency-Key of the charge of ``order_id`` for ``run_date``: stable across reruns.
+        Retries of a failed charge (``attempt`` > 0) each get their own key.
+        """
+        dbuuid = self.env["ir.config_parameter"].sudo().get_param("database.uuid", "")
+        seed = f"{dbuuid}:{order_id}:{run_date}" + (f":retry{attempt}" if attempt else "")
+        digest = hashlib.sha256(seed.encode()).hexdigest()[:40]
+        return f"odoo-renewal-{digest}"
+
+    @api.model
+    def _get_param(self, key, default, cast=int):
+        try:
+            return max(cast(self.env["ir.config_parameter"].sudo().get_param(
+                f"mollie_recurring_payments.{key}", default
+            )), 0)
+        except (TypeError, ValueError):
+            return default
+
+    @api.model
+    def _get_slot_quota(self, pending_count, now=None):
+        """
+        Number of charges to send in this slot (None: no spreading, send everything).
+
+        The pending charges are spread evenly over the slots left until
+        ``charge_window_end_hour`` (UTC), and a slot never sends more than its share
+        of the Mollie rate budget; what does not fit runs in the following slots.
+        """
+        slot_minutes = self._get_param("charge_slot_minutes", 15)
+        if not slot_minutes:
+            return None
+        now = now or fields.Datetime.now()
+        rate = self._get_param("rate_limit", 10, float) or 10.0
+        reserve = min(self._get_param("rate_limit_reserve", 0.25, float), 0.9)
+        capacity = max(int(rate * (1 - reserve) * slot_minutes * 60 * CHARGE_SLOT_BUDGET_SHARE), 1)
+
+        window_end = now.replace(hour=min(self._get_param("charge_window_end_hour", 20), 23), minute=0, second=0)
+        slots_left = max(math.ceil((window_end - now).total_seconds() / (slot_minutes * 60)), 1)
+        return min(capacity, max(math.ceil(pending_count / slots_left), 1))
+
+    @api.model
+    def _get_chunk_size(self):
+        try:
+            return max(int(self.env["ir.config_parameter"].sudo().get_param(
+                "mollie_recurring_payments.charge_chunk_size", 100
+            )), 1)
+        except (TypeError, ValueError):
+            return 100
+
+    # -------------------------------------------------------------------------
+    # Cron entry point
+    # -------------------------------------------------------------------------
+    @api.model
+    def _cron_process_charge_runs(self):
+        """
+        Run one slot of charges: unfinished runs of previous days first, then the
+        renewals due within the catch-up window, then today's.
+        """
+        today = fields.Date.today()
+        runs = self.search([("state", "=", "running"), ("run_date", "<", today)], order="run_date, id")
+        # Renewals missed by downtime or an interrupted day are still due on their own date
+        for days in range(self._get_param("charge_catch_up_days", 3), 0, -1):
+            runs |= self._get_or_create_run(today - timedelta(days=days), create=False)
+        runs |= self._get_or_create_run(today)
+        # Done runs only come back (as running) when they gained new lines
+        runs = runs.filtered(lambda run: run.state == "running").sorted(lambda run: (run.run_date, run.id))
+
+        Line = self.env["mollie.charge.run.line"]
+        pending_domain = [("run_id", "in", runs.ids), ("state", "=", "pending")]
+        quota = self._get_slot_quota(Line.search_count(pending_domain))
+        for run in runs:
+            if quota is not None and quota <= 0:
+                break
+            before = quota is not None and Line.search_count([("run_id", "=", run.id), ("state", "=", "pending")])
+            if not run._process(limit=quota):
+                # Rate-limited: leave the remaining runs alone until the budget recovers
+                break
+            if quota is not None:
+                quota -= before - Line.search_count([("run_id", "=", run.id), ("state", "=", "pending")])
+
+        # Next slot, charges postponed by rate limiting or retried after a transient error
+        if Line.search_count(pending_domain):
+            self._schedule_resume(delay=timedelta(minutes=self._get_param("charge_slot_minutes", 15)) or None)
+        return True
+
+    @api.model
+    def _schedule_resume(self, delay=None):
+        cron = self.env.ref("sale_subscription.account_analytic_cron_for_invoice", raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at=fields.Datetime.now() + max(delay or CHARGE_RUN_RESUME_DELAY, CHARGE_RUN_RESUME_DELAY))
+
+    @api.model
+    def _get_or_create_run(self, run_date, create=True):
+        """
+        Run of ``run_date``, with a pending line for every order that became due since it started.
+        With ``create=False``, a missing run is only created when orders are due that day.
+        """
+        run = self.search([("run_date", "=", run_date)], limit=1)
+
+        SaleOrder = self.env["sale.order"]
+        with timed_stage("select", 1):
+            due_ids = SaleOrder.search(SaleOrder._mollie_subscription_base_domain(today=run_date)).ids
+        if not run:
+            if not (create or due_ids):
+                return run
+            run = self.create({"run_date": run_date})
+        self.env.cr.execute("SELECT order_id FROM mollie_charge_run_line WHERE run_id = %s", (run.id,))
+        known_ids = {row[0] for row in self.env.cr.fetchall()}
+        new_ids = [order_id for order_id in due_ids if order_id not in known_ids]
+        if new_ids:
+            run.write({"state": "running", "finished_at": False})
+            _logger.info("📦 Mollie charge run %s: %d subscription(s) due", run.name, len(new_ids))
+            for chunk_ids in split_every(LINE_CREATE_CHUNK_SIZE, new_ids):
+                self.env["mollie.charge.run.line"].create([{
+                    "run_id": run.id,
+                    "order_id": order_id,
+                    "idempotency_key": self._charge_key(order_id, run_date),
+                } for order_id in chunk_ids])
+                self._checkpoint()
+        elif not known_ids:
+            _logger.info("✅ No subscription payments due for today (%s)", run_date)
+
+        # The line set is the checkpoint: persist it before charging anything
+        self._auto_commit()
+        return run
+
+    def _process(self, limit=None):
+        """
+        Charge the pending lines chunk by chunk and invoice the charged orders.
+        ``limit`` caps the number of pending lines sent (one slot's quota).
+        Return False when Mollie rate limiting paused the run.
+        """
+        self.ensure_one()
+        Line = self.env["mollie.charge.run.line"]
+        chunk_size = self._get_chunk_size()
+
+        # Orders charged before an interruption only need their invoice
+        for lines in self._iter_line_chunks("sent", chunk_size):
+            lines._invoice()
+            self._notify()
+            self._checkpoint()
+
+        # Each pass walks the pending lines once: lines left pending by a
+        # transient error are retried by the next pass, not in a loop here.
+        for lines in self._iter_line_chunks("pending", chunk_size):
+            if limit is not None:
+                if limit <= 0:
+                    return True
+                lines, limit = lines[:limit], limit - len(lines[:limit])
+            paused = not lines._send()
+            lines.filtered(lambda line: line.state == "sent")._invoice()
+            self._notify()
+            self._checkpoint()
+            if paused:
+                return False
+
+        if self.state == "running" and not Line.search_count(
+            [("run_id", "=", self.id), ("state", "in", ("pending", "sent"))]
+        ):
+            self.write({"state": "done", "finished_at": fields.Datetime.now()})
+            _logger.info("🏁 Mollie charge run %s completed", self.name)
+        self._auto_commit()
+        return True
+
+    @api.model
+    def _queue_note(self, record, body):
+        """Queue a chatter note on ``record``, logged by the notify stage."""
+        data = self.env.cr.precommit.data
+        if "mollie_charge_notes" not in data:
+            data["mollie_charge_notes"] = {}
+            # Notes queued outside of a pipeline run are still logged with the transaction
+            self.env.cr.precommit.add(self._notify)
+        data["mollie_charge_notes"].setdefault((record._name, record.id), []).append(body)
+
+    @api.model
+    def _notify(self):
+        """Notify stage: log the queued chatter notes, one batch per model."""
+        notes = self.env.cr.precommit.data.pop("mollie_charge_notes", None)
+        if not notes:
+            return
+        with timed_stage("notify", len(notes)):
+            bodies_by_model = {}
+            for (model, res_id), bodies in notes.items():
+                bodies_by_model.setdefault(model, {})[res_id] = Markup("<br/>").join(bodies)
+            for model, bodies in bodies_by_model.items():
+                self.env[model].browse(list(bodies)).sudo()._message_log_batch(bodies=bodies)
+
+    def _iter_line_chunks(self, state, chunk_size):
+        """
+        Yield the lines of this run in ``state``, ``chunk_size`` at a time and in id order.
+        A cursor on the last id seen keeps each query cheap and visits every line once,
+        even when the caller commits and clears the cache between chunks.
+        """
+        self.ensure_one()
+        Line = self.env["mollie.charge.run.line"]
+        cursor = 0
+        while True:
+            lines = Line.search(
+                [("run_id", "=", self.id), ("state", "=", state), ("id", ">", cursor)],
+                order="id",
+                limit=chunk_size,
+            )
+            if not lines:
+                return
+            cursor = lines[-1].id
+            yield lines
+
+
+class MollieChargeRunLine(models.Model):
+    """Charge of one subscription order within a :class:`MollieChargeRun`."""
+
+    _name = "mollie.charge.run.line"
+    _description = "Mollie Charge Run Line"
+    _order = "id"
+
+    run_id = fields.Many2one("mollie.charge.run", string="Run", required=True, ondelete="cascade", index=True)
+    order_id = fields.Many2one("sale.order", string="Order", required=True, ondelete="cascade", index=True)
+    partner_id = fields.Many2one(related="order_id.partner_id", string="Customer")
+    state = fields.Selection(
+        [
+            ("pending", "Pending"),
+            ("sent", "Sent"),
+            ("confirmed", "Confirmed"),
+            ("failed", "Failed"),
+            ("skipped", "Skipped"),
+        ],
+        string="Status",
+        default="pending",
+        required=True,
+        readonly=True,
+        index=True,
+    )
+    idempotency_key = fields.Char(string="Idempotency Key", required=True, readonly=True)
+    payment_id = fields.Char(string="Mollie Payment ID", readonly=True, index="btree_not_null")
+    amount = fields.Float(string="Amount", digits=(16, 2), readonly=True)
+    attempts = fields.Integer(string="Attempts", readonly=True)
+    last_attempt_at = fields.Datetime(string="Last Attempt", readonly=True)
+    error = fields.Text(string="Error", readonly=True)
+
+    _sql_constraints = [
+        ("run_order_uniq", "unique(run_id, order_id)", "An order is charged once per run."),
+    ]
+
+    def _skip_ineligible(self):
+        """Skip lines whose order is no longer due, is blocked or lost its mandate. Return the others."""
+        ChargeRun = self.env["mollie.charge.run"]
+        blocked_ids = set(self.order_id._mollie_screen_blocked_orders().ids)
+        eligible = self.browse()
+        for line in self:
+            order = line.order_id
+            if order.id in blocked_ids:
+                _logger.info("⏭️ Skipping blocked subscription order %s", order.name)
+                ChargeRun._queue_note(
+                    order, Markup("⏭️ Skipped Mollie export because subscription is churned / paused / closed.")
+                )
+                line.write({"state": "skipped", "error": "Subscription churned / paused / closed"})
+            elif order.state not in ("sale", "done") or (
+                # A retry of a failed payment charges the invoice that already exists
+                order.next_invoice_date != line.run_id.run_date and not line.payment_id
+            ):
+                line.write({"state": "skipped", "error": "No longer due"})
+            elif order.mollie_mandate_ref_id.status != "valid":
+                line.write({"state": "skipped", "error": "No valid Mollie mandate"})
+            else:
+                eligible |= line
+        return eligible
+
+    def _recover_in_flight(self, client):
+        """
+        Look up the charges of lines sent so long ago that Mollie no longer replays their
+        Idempotency-Key. Return ``(not_found, paused)``: the lines that were not found (and
+        can be sent again), and whether the rate limit stopped the lookups. Lines whose
+        lookup failed or did not run stay pending for the next pass.
+        """
+        not_found = self.browse()
+        for line in self:
+            customer_id = line.order_id.partner_id.mollie_customer_id
+            try:
+                resp = client.get(
+                    f"/v2/customers/{customer_id}/payments", params={"limit": 50}, priority=PRIORITY_BACKGROUND
+                )
+            except MollieRateLimited as e:
+                _logger.warning("🛑 Mollie in-flight charge recovery paused: %s", e)
+                return not_found, True
+            except (MollieAPIError, requests.RequestException) as e:
+                _logger.warning("⚠️ Could not verify in-flight Mollie charge of %s: %s", line.order_id.name, e)
+                continue
+            if resp is None or resp.status_code != 200:
+                # Unknown outcome: never risk a second charge, try again on the next pass
+                _logger.warning("⚠️ Could not verify in-flight Mollie charge of %s", line.order_id.name)
+                continue
+            payments = ((resp.json() if resp.content else {}).get("_embedded") or {}).get("payments") or []
+            data = next(
+                (p for p in payments if (p.get("metadata") or {}).get("charge_key") == line.idempotency_key),
+                None,
+            )
+            if data:
+                _logger.info("🔁 Recovered in-flight Mollie charge %s of %s", data.get("id"), line.order_id.name)
+                line._mark_sent(data)
+            else:
+                not_found |= line
+        return not_found, False
+
+    def _send(self):
+        """
+        Screen, charge and persist these pending lines (one lane per Mollie account).
+        Return False when the shared rate limit stopped the chunk.
+        """
+        with timed_stage("screen", len(self)):
+            lines = self._skip_ineligible()
+        if not lines:
+            return True
+        with timed_stage("charge", len(lines)):
+            results, paused = lines._charge()
+        with timed_stage("persist", len(results)):
+            paused = not self._persist(results) or paused
+        if paused:
+            _logger.warning("🛑 Mollie charge run paused by rate limiting, pending charges resume later")
+        return not paused
+
+    def _charge(self):
+        """
+        Create the Mollie payments of these lines. Return ``([(line, result)], paused)``,
+        with ``result`` None for the lines postponed without being sent, and ``paused``
+        set when the rate limit stopped the recovery of in-flight charges.
+        """
+        workers, rate = self.env["payment.provider"]._mollie_recurring_dispatch_settings()
+        now = fields.Datetime.now()
+        lanes = []
+        paused = False
+        for provider, lane_orders in self.order_id._mollie_group_by_provider():
+            lane_lines = self.filtered(lambda line: line.order_id in lane_orders)
+            client = provider._mollie_recurring_client() if provider else None
+            if not client:
+                _logger.error("❌ Mollie API key is missing for %d subscription(s)", len(lane_lines))
+                lane_lines.write({"state": "failed", "error": "Mollie API key missing"})
+                continue
+            stale = lane_lines.filtered(
+                lambda line: line.attempts and line.last_attempt_at and line.last_attempt_at < now - IDEMPOTENCY_KEY_TTL
+            )
+            if stale:
+                not_found, lane_paused = stale._recover_in_flight(client)
+                lane_lines = (lane_lines - stale) | not_found
+                paused = paused or lane_paused
+            lanes.append((client, lane_lines))
+
+        # Record the attempt before sending, so that a crash mid-chunk is detectable on resume
+        for client, lane_lines in lanes:
+            for line in lane_lines:
+                line.write({"attempts": line.attempts + 1, "last_attempt_at": now})
+        self.env["mollie.charge.run"]._auto_commit()
+
+        lane_results = []
+        for client, lane_lines in lanes:
+            if not client.has_budget(PRIORITY_BACKGROUND):
+                _logger.warning("🛑 Mollie rate budget exhausted, %d charge(s) postponed", len(lane_lines))
+                lane_results.append(((line, None) for line in lane_lines))
+                continue
+            charge_jobs = []
+            for line in lane_lines:
+                order = line.order_id
+                payload = order._mollie_recurring_payment_payload(charge_key=line.idempotency_key)
+                _logger.info(
+                    "💳 Charging %s for %s EUR (Order %s)", order.partner_id.name, payload["amount"]["value"], order.name
+                )
+                charge_jobs.append((line.id, payload, line.idempotency_key))
+            dispatcher = MollieDispatcher(
+                send=lambda job, client=client: client.post(
+                    "/v2/payments",
+                    json=job[1],
+                    headers={"Idempotency-Key": job[2]},
+                    priority=PRIORITY_BACKGROUND,
+                ),
+                max_workers=workers,
+                rate=rate,
+                # If Mollie is still rate-limiting after retries, stop sending the rest of this lane
+                should_abort=lambda response: response is not None and response.status_code == 429,
+            )
+            # Started now so that all lanes send in parallel
+            lane_results.append(((self.browse(result.job[0]), result) for result in dispatcher.start(charge_jobs)))
+        return list(itertools.chain.from_iterable(lane_results)), paused
+
+    @api.model
+    def _persist(self, results):
+        """Apply the ``[(line, result)]`` of :meth:`_charge`. Return False when rate limiting paused sending."""
+        paused = False
+        for line, result in results:
+            if result is None or result.skipped:
+                paused = True
+                line._postpone()
+                continue
+            if result.error:
+                line._mark_transient_failure(str(result.error))
+                continue
+
+            response = result.response
+            try:
+                data = response.json() if response.content else {}
+            except ValueError:
+                data = {"detail": response.text}
+
+            if response.status_code == 201:
+                line._mark_sent(data)
+            elif response.status_code == 429:
+                paused = True
+                line._postpone()
+            elif response.status_code >= 500:
+                line._mark_transient_failure(f"Mollie error {response.status_code}: {data}", response.status_code)
+            else:
+                line._mark_failed(data, response.status_code)
+        return not paused
+
+    def _postpone(self):
+        """Not sent because of rate limiting: does not count as an attempt."""
+        self.ensure_one()
+        self.write({"attempts": max(self.attempts - 1, 0)})
+
+    def _mark_transient_failure(self, error, status_code=None):
+        self.ensure_one()
+        order = self.order_id
+        _logger.error("⚠️ Mollie exception for %s: %s", order.name, error)
+        if self.attempts >= CHARGE_MAX_ATTEMPTS:
+            self.env["mollie.charge.run"]._queue_note(order, Markup("⚠️ Mollie exception: %s") % error)
+            self.write({"state": "failed", "error": error})
+            # Network errors have no status code: retried on the server error schedule
+            Retry = self.env["mollie.charge.retry"]
+            reason = Retry._classify_failure({}, status_code=status_code) if status_code else "server_error"
+            Retry._schedule(self, reason, error=error)
+        else:
+            self.write({"error": error})
+
+    def _mark_failed(self, data, status_code=None):
+        self.ensure_one()
+        order = self.order_id
+        self.env["mollie.charge.run"]._queue_note(order, Markup("❌ Mollie payment failed: %s") % (data,))
+        _logger.error("❌ Mollie payment failed for %s: %s", order.name, data)
+        self.write({"state": "failed", "error": str(data)})
+        Retry = self.env["mollie.charge.retry"]
+        Retry._schedule(self, Retry._classify_failure(data, status_code=status_code), error=str(data))
+
+    def _has_newer_charge(self):
+        """A later billing period of the order was already charged on Mollie."""
+        self.ensure_one()
+        return bool(self.search_count([
+            ("order_id", "=", self.order_id.id),
+            ("run_id.run_date", ">", self.run_id.run_date),
+            ("payment_id", "!=", False),
+        ], limit=1))
+
+    def _mark_sent(self, data):
+        self.ensure_one()
+        order = self.order_id
+        payment_id = data.get("id")
+        self.env["mollie.charge.run"]._queue_note(
+            order, Markup("✅ Subscription payment exported to Mollie : <br/>Payment ID: <b>%s</b>") % payment_id
+        )
+        status = data.get("status") or "open"
+        amount = float((data.get("amount") or {}).get("value") or 0.0)
+        event_vals = order._mollie_payment_event_vals(payment_id, status, amount=amount, method=data.get("method"))
+        if self.payment_id and self.payment_id != payment_id:
+            # Retry of a failed payment: its invoice is now settled by the new one
+            self.env["account.move"].sudo().search([("mollie_payment_id", "=", self.payment_id)]).write({
+                "mollie_payment_id": payment_id,
+            })
+            if order.last_payment_id not in (False, self.payment_id) and self._has_newer_charge():
+                # Late retry of an older period: the order keeps following its current payment,
+                # this one is tracked through its invoice and the payment ledger
+                self.write({"state": "sent", "payment_id": payment_id, "amount": amount, "error": False})
+                return
+        order.sudo().write({
+            **event_vals,
+            "last_payment_id": payment_id,
+            "mollie_last_payment_unpaid_since": False,
+            "mollie_last_payment_paid": False,
+            "mollie_last_payment_status": status,
+            "mollie_status_check_count": 0,
+            "mollie_next_status_check_at": order._mollie_next_status_check_at(method=data.get("method")),
+        })
+        self.write({
+            "state": "sent",
+            "payment_id": payment_id,
+            "amount": amount,
+            "error": False,
+        })
+
+    def _invoice(self):
+        """Invoice the orders of these sent lines, and confirm the lines whose order got invoiced."""
+        if not self:
+            return
+        # Already invoiced before an interruption: the renewal date moved past the run's date
+        to_invoice = self.filtered(lambda line: line.order_id.next_invoice_date == line.run_id.run_date)
+        if to_invoice:
+            with timed_stage("invoice", len(to_invoice)):
+                to_invoice.order_id._mollie_invoice_charged_orders(
+                    {line.order_id.id: line.payment_id for line in to_invoice if line.payment_id}
+                )
+        invoiced = self.filtered(lambda line: line.order_id.next_invoice_date != line.run_id.run_date)
+        invoiced.write({"state": "confirmed"})
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, api, fields
+from odoo.tools import create_index
+
+_logger = logging.getLogger(__name__)
+
+
+class MollieMandate(models.Model):
+    """
+    One row per Mollie mandate.
+
+    Subscription orders reference their mandate, so a mandate status change
+    (sync, webhook, revocation) updates this row only, and the charge
+    eligibility domain joins this small table instead of res.partner.
+    Rows are kept in step with the partner's current mandate by
+    :meth:`res.partner._mollie_link_mandates`.
+    """
+
+    _name = "mollie.mandate"
+    _description = "Mollie Mandate"
+    _rec_name = "mandate_id"
+    _order = "id desc"
+
+    mandate_id = fields.Char(string="Mollie Mandate ID", required=True, readonly=True)
+    customer_id = fields.Char(string="Mollie Customer ID", readonly=True, index=True)
+    partner_id = fields.Many2one("res.partner", string="Customer", readonly=True, index=True, ondelete="set null")
+    status = fields.Char(string="Status", readonly=True, index=True)
+    method = fields.Char(string="Method", readonly=True)
+
+    _sql_constraints = [
+        ("mandate_id_uniq", "unique(mandate_id)", "A Mollie mandate is stored once."),
+    ]
+
+    def init(self):
+        create_index(
+            self.env.cr,
+            "mollie_mandate_customer_status_index",
+            self._table,
+            ["customer_id", "status"],
+        )
+
+    @api.model
+    def _upsert(self, vals_list):
+        """
+        Insert or update mandates from ``{mandate_id, customer_id, partner_id, status, method}``
+        dicts (missing keys keep their stored value). Return ``{mandate_id: id}``.
+        """
+        rows = {}
+        for vals in vals_list:
+            if vals.get("mandate_id"):
+                rows[vals["mandate_id"]] = vals
+        if not rows:
+            return {}
+
+        columns = ("mandate_id", "customer_id", "partner_id", "status", "method")
+        params = []
+        for vals in rows.values():
+            params += [vals.get(column) or None for column in columns]
+        self.env.cr.execute(
+            f"""
+            INSERT INTO mollie_mandate (mandate_id, customer_id, partner_id, status, method,
+                                        create_uid, create_date, write_uid, write_date)
+            VALUES {", ".join([f"(%s, %s, %s, %s, %s, {self.env.uid}, now() at time zone 'UTC', {self.env.uid}, now() at time zone 'UTC')"] * len(rows))}
+            ON CONFLICT (mandate_id) DO UPDATE SET
+                customer_id = COALESCE(EXCLUDED.customer_id, mollie_mandate.customer_id),
+                partner_id = COALESCE(EXCLUDED.partner_id, mollie_mandate.partner_id),
+                status = COALESCE(EXCLUDED.status, mollie_mandate.status),
+                method = COALESCE(EXCLUDED.method, mollie_mandate.method),
+                write_uid = EXCLUDED.write_uid,
+                write_date = EXCLUDED.write_date
+            RETURNING mandate_id, id
+            """,
+            params,
+        )
+        result = dict(self.env.cr.fetchall())
+        self.invalidate_model()
+        return result
+
+    @api.model
+    def _backfill_from_partners(self):
+        """Create the mandates of partners synced before this model existed, and link them."""
+        partners = self.env["res.partner"].with_context(active_test=False).search([
+            ("mollie_mandate_id", "!=", False),
+            ("mollie_mandate_ref_id", "=", False),
+        ])
+        if partners:
+            partners._mollie_link_mandates()
+            _logger.info("Linked the Mollie mandates of %d partner(s)", len(partners))
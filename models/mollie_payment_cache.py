@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from odoo import models, api, fields
+
+from ..tools.mollie_client import MollieAPIError, PRIORITY_INTERACTIVE
+
+_logger = logging.getLogger(__name__)
+
+
+class MolliePaymentCache(models.Model):
+    """
+    Short-lived cache of Mollie payment payloads, shared by all workers.
+
+    Webhook, manual refresh and cron paths read payments through
+    :meth:`_get_payment`, so a payment fetched by one of them is not fetched
+    again by another within the TTL. A webhook for a payment drops its entry.
+
+    Entries are written and dropped on a short cursor of their own that commits
+    right away: they are visible to other workers at once, and a webhook never
+    waits on the row locks of a long cron transaction.
+    """
+
+    _name = "mollie.payment.cache"
+    _description = "Mollie Payment Cache"
+    _log_access = False
+
+    payment_id = fields.Char(string="Mollie Payment ID", required=True, readonly=True)
+    payload = fields.Json(string="Payload", readonly=True)
+    fetched_at = fields.Datetime(string="Fetched At", required=True, readonly=True)
+
+    _sql_constraints = [
+        ("payment_id_uniq", "unique(payment_id)", "A Mollie payment can only be cached once."),
+    ]
+
+    @api.model
+    def _get_ttl(self):
+        try:
+            return int(self.env["ir.config_parameter"].sudo().get_param(
+                "mollie_recurring_payments.payment_cache_ttl", 60
+            ))
+        except (TypeError, ValueError):
+            return 60
+
+    @api.model
+    def _get_payment(self, client, payment_id, priority=PRIORITY_INTERACTIVE):
+        """Return the payload of ``payment_id``, from the cache when fresh, else from Mollie."""
+        min_fetched_at = fields.Datetime.now() - timedelta(seconds=self._get_ttl())
+        self.env.cr.execute(
+            "SELECT payload FROM mollie_payment_cache WHERE payment_id = %s AND fetched_at >= %s",
+            (payment_id, min_fetched_at),
+        )
+        row = self.env.cr.fetchone()
+        if row and row[0]:
+            return row[0]
+
+        resp = client.get(f"/v2/payments/{payment_id}", priority=priority)
+        if resp is None or resp.status_code != 200:
+            raise MollieAPIError(resp.text if resp is not None else "No response", response=resp)
+        data = resp.json() if resp.content else {}
+        self._store_payments([data])
+        return data
+
+    @api.model
+    def _get_cached_payments(self, payment_ids):
+        """Return ``{payment_id: payload}`` of the payments of ``payment_ids`` still fresh in the cache."""
+        if not payment_ids:
+            return {}
+        min_fetched_at = fields.Datetime.now() - timedelta(seconds=self._get_ttl())
+        self.env.cr.execute(
+            "SELECT payment_id, payload FROM mollie_payment_cache WHERE payment_id IN %s AND fetched_at >= %s",
+            (tuple(payment_ids), min_fetched_at),
+        )
+        return {payment_id: payload for payment_id, payload in self.env.cr.fetchall() if payload}
+
+    @api.model
+    def _get_payment_from_providers(self, providers, payment_id):
+        """
+        Like _get_payment(), for a payment whose Mollie account is not known:
+        each provider (lane) is tried in turn until one of them knows the payment.
+        """
+        error = MollieAPIError("No Mollie provider with an API key")
+        for provider in providers:
+            try:
+                return self._get_payment(provider._mollie_recurring_client(), payment_id)
+            except MollieAPIError as e:
+                error = e
+                if e.response is None or e.response.status_code != 404:
+                    raise
+        raise error
+
+    @api.model
+    def _store_payments(self, payloads):
+        """Upsert payment payloads (e.g. from a payments list page) into the cache."""
+        # One row per payment id: ON CONFLICT cannot update the same row twice in a statement
+        rows = {data["id"]: json.dumps(data) for data in payloads if data.get("id")}
+        if not rows:
+            return
+        now = fields.Datetime.now()
+        params = []
+        # Sorted, so that concurrent upserts lock their rows in the same order
+        for payment_id, payload in sorted(rows.items()):
+            params += [payment_id, payload, now]
+        with self._cursor() as cr:
+            cr.execute(
+                f"""
+                INSERT INTO mollie_payment_cache (payment_id, payload, fetched_at)
+                VALUES {", ".join(["(%s, %s::jsonb, %s)"] * len(rows))}
+                ON CONFLICT (payment_id)
+                DO UPDATE SET payload = EXCLUDED.payload, fetched_at = EXCLUDED.fetched_at
+                """,
+                params,
+            )
+
+    @api.model
+    def _invalidate(self, payment_ids):
+        if payment_ids:
+            with self._cursor() as cr:
+                cr.execute(
+                    "DELETE FROM mollie_payment_cache WHERE payment_id IN %s",
+                    (tuple(sorted(payment_ids)),),
+                )
+
+    @contextmanager
+    def _cursor(self):
+        """Short cursor committed on exit (the test cursor inside tests)."""
+        if getattr(threading.current_thread(), "testing", False):
+            yield self.env.cr
+            return
+        with self.env.registry.cursor() as cr:
+            yield cr
+
+    @api.autovacuum
+    def _gc_expired_entries(self):
+        limit_date = fields.Datetime.now() - timedelta(days=1)
+        self.env.cr.execute("DELETE FROM mollie_payment_cache WHERE fetched_at < %s", (limit_date,))
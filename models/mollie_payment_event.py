@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import models, api, fields
+from odoo.tools import create_index
+
+_logger = logging.getLogger(__name__)
+
+
+class MolliePaymentEvent(models.Model):
+    """
+    Append-only ledger of Mollie payment status transitions.
+
+    One row per observed ``(payment_id, status)``: a status seen again by a
+    later refresh or webhook is not stored twice. Subscription orders point at
+    their latest row, and payment history reporting reads this table instead
+    of chatter messages. Rows older than the retention window are purged,
+    except the ones still pointed at by an order.
+    """
+
+    _name = "mollie.payment.event"
+    _description = "Mollie Payment Event"
+    _log_access = False
+    _order = "observed_at desc, id desc"
+
+    payment_id = fields.Char(string="Mollie Payment ID", required=True, readonly=True, index=True)
+    status = fields.Char(string="Status", required=True, readonly=True)
+    order_id = fields.Many2one("sale.order", string="Order", readonly=True, ondelete="set null")
+    partner_id = fields.Many2one("res.partner", string="Customer", readonly=True, ondelete="set null")
+    company_id = fields.Many2one("res.company", string="Company", readonly=True)
+    currency_id = fields.Many2one("res.currency", string="Currency", readonly=True)
+    amount = fields.Monetary(string="Amount", currency_field="currency_id", readonly=True)
+    method = fields.Char(string="Method", readonly=True)
+    paid_at = fields.Datetime(string="Paid At", readonly=True)
+    observed_at = fields.Datetime(string="Observed At", required=True, readonly=True, index=True)
+
+    _sql_constraints = [
+        ("payment_status_uniq", "unique(payment_id, status)", "A Mollie payment status is recorded once."),
+    ]
+
+    def init(self):
+        create_index(self.env.cr, "mollie_payment_event_order_observed_index", self._table, ["order_id", "observed_at"])
+        create_index(self.env.cr, "mollie_payment_event_partner_observed_index", self._table, ["partner_id", "observed_at"])
+
+    @api.model
+    def _get_retention_days(self):
+        try:
+            return int(self.env["ir.config_parameter"].sudo().get_param(
+                "mollie_recurring_payments.payment_event_retention_days", 730
+            ))
+        except (TypeError, ValueError):
+            return 730
+
+    @api.model
+    def _record(self, vals_list):
+        """
+        Append ``{payment_id, status, order_id, partner_id, company_id, currency_id, amount,
+        method, paid_at}`` rows; a transition already recorded is kept as is.
+        Return ``{(payment_id, status): id}`` of the rows, new or existing.
+        """
+        rows = {}
+        for vals in vals_list:
+            if vals.get("payment_id") and vals.get("status"):
+                rows[(vals["payment_id"], vals["status"])] = vals
+        if not rows:
+            return {}
+
+        columns = ("payment_id", "status", "order_id", "partner_id", "company_id",
+                   "currency_id", "amount", "method", "paid_at")
+        params = []
+        for vals in rows.values():
+            params += [vals.get(column) or None for column in columns]
+        self.env.cr.execute(
+            f"""
+            INSERT INTO mollie_payment_event ({", ".join(columns)}, observed_at)
+            VALUES {", ".join([f"({', '.join(['%s'] * len(columns))}, now() at time zone 'UTC')"] * len(rows))}
+            ON CONFLICT (payment_id, status) DO NOTHING
+            """,
+            params,
+        )
+        self.env.cr.execute(
+            "SELECT payment_id, status, id FROM mollie_payment_event WHERE (payment_id, status) IN %s",
+            (tuple(rows),),
+        )
+        return {(payment_id, status): event_id for payment_id, status, event_id in self.env.cr.fetchall()}
+
+    @api.model
+    def _backfill_from_orders(self):
+        """Record the last known payment of orders observed before the ledger existed."""
+        self.env.cr.execute(
+            """
+            INSERT INTO mollie_payment_event (payment_id, status, order_id, partner_id, company_id,
+                                              currency_id, amount, paid_at, observed_at)
+            SELECT so.last_payment_id, so.mollie_last_payment_status, so.id, so.partner_id, so.company_id,
+                   so.currency_id, so.mollie_last_payment_amount, so.mollie_last_payment_paid_at,
+                   COALESCE(so.mollie_last_payment_checked_at, so.write_date)
+              FROM sale_order so
+             WHERE so.last_payment_id IS NOT NULL
+               AND so.mollie_last_payment_status IS NOT NULL
+               AND so.mollie_last_payment_event_id IS NULL
+            ON CONFLICT (payment_id, status) DO NOTHING
+            """
+        )
+        self.env.cr.execute(
+            """
+            UPDATE sale_order so
+               SET mollie_last_payment_event_id = event.id
+              FROM mollie_payment_event event
+             WHERE so.mollie_last_payment_event_id IS NULL
+               AND event.payment_id = so.last_payment_id
+               AND event.status = so.mollie_last_payment_status
+            """
+        )
+        linked = self.env.cr.rowcount
+        if linked:
+            self.env["sale.order"].invalidate_model(["mollie_last_payment_event_id"])
+            _logger.info("Linked %d order(s) to their last Mollie payment event", linked)
+
+    @api.autovacuum
+    def _gc_expired_events(self):
+        limit_date = fields.Datetime.now() - timedelta(days=self._get_retention_days())
+        self.env.cr.execute(
+            """
+            DELETE FROM mollie_payment_event event
+             WHERE event.observed_at < %s
+               AND NOT EXISTS (SELECT 1 FROM sale_order so WHERE so.mollie_last_payment_event_id = event.id)
+            """,
+            (limit_date,),
+        )
+        if self.env.cr.rowcount:
+            _logger.info("🧹 Purged %d Mollie payment event(s) older than %s", self.env.cr.rowcount, limit_date)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+
+class MollieRateLimit(models.Model):
+    """
+    Token bucket of one Mollie API key, shared by every Odoo worker and node.
+
+    Rows are read and written with plain SQL by
+    :class:`~odoo.addons.mollie_recurring_payments.tools.mollie_rate_limiter.MollieRateLimiter`,
+    on cursors of their own; the model only owns the table.
+    """
+
+    _name = "mollie.rate.limit"
+    _description = "Mollie API Rate Limit"
+    _log_access = False
+
+    key = fields.Char(string="Key", required=True, readonly=True)
+    tokens = fields.Float(string="Tokens", readonly=True)
+    rate = fields.Float(string="Current Rate (req/s)", readonly=True)
+    max_rate = fields.Float(string="Max Rate (req/s)", readonly=True)
+    capacity = fields.Float(string="Burst", readonly=True)
+    reserve = fields.Float(string="Interactive Reserve", readonly=True)
+    updated_at = fields.Datetime(string="Updated At", readonly=True)
+    blocked_until = fields.Datetime(string="Paused Until", readonly=True)
+
+    _sql_constraints = [
+        ("key_uniq", "unique(key)", "A Mollie API key has a single rate limit bucket."),
+    ]
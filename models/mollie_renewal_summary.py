@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, api, fields
+
+_logger = logging.getLogger(__name__)
+
+# Fields of sale.order the summary is built from: writing one of them queues a refresh
+MOLLIE_SUMMARY_FIELDS = frozenset({
+    "next_invoice_date",
+    "mollie_last_payment_status",
+    "mollie_last_payment_unpaid_since",
+    "state",
+    "plan_id",
+    "company_id",
+    "amount_total",
+})
+# Fields of sale.order.line changing the amount of their order (amount_total is
+# recomputed at flush, without going through sale.order.write())
+MOLLIE_SUMMARY_LINE_FIELDS = frozenset({
+    "product_id",
+    "product_uom_qty",
+    "product_uom",
+    "price_unit",
+    "discount",
+    "tax_id",
+})
+
+AGING_BUCKETS = [
+    ("none", "Not Unpaid"),
+    ("0_7", "0-7 Days"),
+    ("8_30", "8-30 Days"),
+    ("31_60", "31-60 Days"),
+    ("61_plus", "61+ Days"),
+]
+
+_REBUILT_ON_PARAM = "mollie_recurring_payments.renewal_summary_rebuilt_on"
+
+_AGING_SQL = """
+    CASE
+        WHEN {since} IS NULL THEN 'none'
+        WHEN %(today)s - {since} <= 7 THEN '0_7'
+        WHEN %(today)s - {since} <= 30 THEN '8_30'
+        WHEN %(today)s - {since} <= 60 THEN '31_60'
+        ELSE '61_plus'
+    END
+"""
+
+
+class MollieRenewalSummary(models.Model):
+    """
+    Subscription renewals aggregated by renewal date, Mollie status and unpaid age.
+
+    A stored aggregate of sale.order, so the dashboard reads a few hundred rows
+    instead of grouping every subscription order. Order writes touching the
+    summarized fields queue their renewal dates; the refresh cron recomputes
+    only those dates, and rebuilds everything (aging included) once a day.
+    """
+
+    _name = "mollie.renewal.summary"
+    _description = "Mollie Renewal Summary"
+    _log_access = False
+    _order = "renewal_date desc, mollie_status"
+
+    company_id = fields.Many2one("res.company", string="Company", readonly=True)
+    currency_id = fields.Many2one("res.currency", string="Currency", readonly=True)
+    renewal_date = fields.Date(string="Renewal Date", readonly=True, index=True)
+    mollie_status = fields.Char(string="Mollie Status", readonly=True)
+    unpaid_since = fields.Date(string="Unpaid Since", readonly=True)
+    aging_bucket = fields.Selection(AGING_BUCKETS, string="Unpaid Age", readonly=True)
+    order_count = fields.Integer(string="Subscriptions", readonly=True)
+    amount_total = fields.Monetary(string="Amount", currency_field="currency_id", readonly=True)
+    unpaid_amount = fields.Monetary(string="Unpaid Amount", currency_field="currency_id", readonly=True)
+
+    @api.model
+    def _mark_dirty(self, renewal_dates):
+        """Queue a refresh of ``renewal_dates`` (once per date and transaction)."""
+        queued = self.env.cr.precommit.data.setdefault("mollie_renewal_summary_queued", set())
+        dates = {renewal_date or None for renewal_date in renewal_dates} - queued
+        if not dates:
+            return
+        first = not queued
+        queued |= dates
+        self.env.cr.execute(
+            "INSERT INTO mollie_renewal_summary_queue (renewal_date) VALUES "
+            + ", ".join(["(%s)"] * len(dates)),
+            list(dates),
+        )
+        if first:
+            cron = self.env.ref("mollie_recurring_payments.cron_mollie_refresh_renewal_summary", raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger()
+
+    @api.model
+    def _refresh(self, renewal_dates=None):
+        """Recompute the rows of ``renewal_dates`` (every row when None)."""
+        params = {"today": fields.Date.context_today(self)}
+        where = ""
+        if renewal_dates is not None:
+            renewal_dates = set(renewal_dates)
+            if not renewal_dates:
+                return
+            dates = tuple(d for d in renewal_dates if d) or (None,)
+            where = "AND ({col} IN %(dates)s" + (" OR {col} IS NULL)" if None in renewal_dates else ")")
+            params["dates"] = dates
+
+        self.env.cr.execute(
+            "DELETE FROM mollie_renewal_summary WHERE TRUE " + where.format(col="renewal_date"), params
+        )
+        since = "(so.mollie_last_payment_unpaid_since AT TIME ZONE 'UTC')::date"
+        self.env.cr.execute(
+            f"""
+            INSERT INTO mollie_renewal_summary (
+                company_id, currency_id, renewal_date, mollie_status, unpaid_since,
+                aging_bucket, order_count, amount_total, unpaid_amount
+            )
+            SELECT so.company_id,
+                   so.currency_id,
+                   so.next_invoice_date,
+                   COALESCE(so.mollie_last_payment_status, 'none'),
+                   {since},
+                   {_AGING_SQL.format(since=since)},
+                   COUNT(*),
+                   SUM(so.amount_total),
+                   SUM(CASE WHEN so.mollie_last_payment_unpaid_since IS NOT NULL THEN so.amount_total ELSE 0 END)
+              FROM sale_order so
+             WHERE so.plan_id IS NOT NULL
+               AND so.state IN ('sale', 'done')
+               {where.format(col="so.next_invoice_date")}
+          GROUP BY 1, 2, 3, 4, 5
+            """,
+            params,
+        )
+        self.env.invalidate_model("mollie.renewal.summary")
+
+    @api.model
+    def _rebuild(self):
+        self.env.cr.execute("DELETE FROM mollie_renewal_summary_queue")
+        self._refresh()
+        self.env["ir.config_parameter"].sudo().set_param(
+            _REBUILT_ON_PARAM, fields.Date.to_string(fields.Date.context_today(self))
+        )
+        _logger.info("📊 Mollie renewal summary rebuilt")
+
+    @api.model
+    def _cron_refresh(self):
+        """Refresh the queued renewal dates; rebuild everything once a day so unpaid ages move on."""
+        today = fields.Date.to_string(fields.Date.context_today(self))
+        if self.env["ir.config_parameter"].sudo().get_param(_REBUILT_ON_PARAM) != today:
+            self._rebuild()
+            return True
+
+        self.env.cr.execute("DELETE FROM mollie_renewal_summary_queue RETURNING renewal_date")
+        renewal_dates = {row[0] for row in self.env.cr.fetchall()}
+        if renewal_dates:
+            self._refresh(renewal_dates)
+            _logger.info("📊 Mollie renewal summary: %d renewal date(s) refreshed", len(renewal_dates))
+        return True
+
+
+class MollieRenewalSummaryQueue(models.Model):
+    """Renewal dates whose summary rows are stale (appended by order writes, drained by the cron)."""
+
+    _name = "mollie.renewal.summary.queue"
+    _description = "Mollie Renewal Summary Refresh Queue"
+    _log_access = False
+
+    renewal_date = fields.Date(string="Renewal Date", readonly=True)
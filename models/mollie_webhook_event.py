@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import models, api, fields
+
+from ..tools.mollie_client import MollieRateLimited
+
+_logger = logging.getLogger(__name__)
+
+
+class MollieWebhookEvent(models.Model):
+    """
+    Inbox of Mollie subscription webhooks.
+
+    The controller only stores the payment id and answers Mollie right away.
+    The drain cron fetches each unique payment once and applies it.
+    """
+
+    _name = "mollie.webhook.event"
+    _description = "Mollie Webhook Inbox"
+    _order = "id"
+
+    payment_id = fields.Char(string="Mollie Payment ID", required=True, readonly=True, index=True)
+    state = fields.Selection(
+        [
+            ("pending", "Pending"),
+            ("done", "Done"),
+            ("error", "Error"),
+        ],
+        string="State",
+        default="pending",
+        required=True,
+        readonly=True,
+        index=True,
+    )
+    received_at = fields.Datetime(string="Received At", default=fields.Datetime.now, readonly=True)
+    processed_at = fields.Datetime(string="Processed At", readonly=True)
+    attempts = fields.Integer(string="Attempts", readonly=True)
+    error = fields.Text(string="Error", readonly=True)
+
+    _MAX_ATTEMPTS = 5
+
+    @api.model
+    def _enqueue(self, payment_id):
+        """Store a webhook notification and wake up the drain cron."""
+        event = self.sudo().create({"payment_id": payment_id})
+        # The payment changed on Mollie's side: drop any cached copy
+        self.env["mollie.payment.cache"].sudo()._invalidate([payment_id])
+        cron = self.env.ref("mollie_recurring_payments.cron_mollie_drain_webhook_inbox", raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+        return event
+
+    def _get_batch_size(self):
+        try:
+            return int(self.env["ir.config_parameter"].sudo().get_param(
+                "mollie_recurring_payments.webhook_batch_size", 200
+            ))
+        except (TypeError, ValueError):
+            return 200
+
+    @api.model
+    def _cron_drain_inbox(self):
+        """Process one batch of pending webhooks: one status fetch per unique payment id."""
+        batch = self.search([("state", "=", "pending")], limit=self._get_batch_size())
+        if not batch:
+            return True
+
+        payment_ids = list(dict.fromkeys(batch.mapped("payment_id")))
+        # Collapse duplicates, including pending copies beyond this batch
+        events = self.search([("state", "=", "pending"), ("payment_id", "in", payment_ids)])
+        events_by_payment = {}
+        for event in events:
+            events_by_payment.setdefault(event.payment_id, self.browse())
+            events_by_payment[event.payment_id] |= event
+
+        providers = self.env["payment.provider"]._mollie_recurring_providers()
+        if not providers:
+            _logger.error("Subscription webhook inbox: Mollie API key missing!")
+            return False
+
+        SaleOrder = self.env["sale.order"].sudo()
+        PaymentCache = self.env["mollie.payment.cache"].sudo()
+
+        # Payments of known orders are fetched from their own Mollie account (lane)
+        provider_by_payment = {}
+        known_orders = SaleOrder.search([("last_payment_id", "in", payment_ids)])
+        for provider, lane_orders in known_orders._mollie_group_by_provider():
+            for order in lane_orders:
+                provider_by_payment[order.last_payment_id] = provider
+        # Older renewals: the order is found through the invoice linked to the payment
+        payment_ids_by_order = defaultdict(list)
+        for invoice in self.env["account.move"].sudo().search([
+            ("mollie_payment_id", "in", [pid for pid in payment_ids if pid not in provider_by_payment]),
+        ]):
+            for order in invoice.line_ids.sale_line_ids.order_id[:1]:
+                payment_ids_by_order[order.id].append(invoice.mollie_payment_id)
+        for provider, lane_orders in SaleOrder.browse(payment_ids_by_order)._mollie_group_by_provider():
+            for order in lane_orders:
+                provider_by_payment.update(dict.fromkeys(payment_ids_by_order[order.id], provider))
+
+        now = fields.Datetime.now()
+        failed_payment_ids = []
+        for index, payment_id in enumerate(payment_ids):
+            payment_events = events_by_payment[payment_id]
+            try:
+                with self.env.cr.savepoint():
+                    payment_data = PaymentCache._get_payment_from_providers(
+                        provider_by_payment.get(payment_id) or providers, payment_id
+                    )
+                    SaleOrder._mollie_process_subscription_webhook_payment(payment_id, payment_data)
+                    payment_events.write({"state": "done", "processed_at": now, "error": False})
+            except MollieRateLimited as e:
+                # Not the event's fault: no attempt is counted, the rest waits for the budget to recover
+                _logger.warning("🛑 Mollie webhook inbox paused by the rate limiter: %s", e)
+                failed_payment_ids += payment_ids[index:]
+                cron = self.env.ref("mollie_recurring_payments.cron_mollie_drain_webhook_inbox", raise_if_not_found=False)
+                if cron:
+                    cron.sudo()._trigger(at=now + timedelta(seconds=int(e.retry_after or 0) + 1))
+                break
+            except Exception as e:
+                _logger.exception("Subscription webhook inbox: processing failed for payment %s", payment_id)
+                failed_payment_ids.append(payment_id)
+                attempts = max(payment_events.mapped("attempts")) + 1
+                payment_events.write({
+                    "attempts": attempts,
+                    "error": str(e),
+                    "state": "error" if attempts >= self._MAX_ATTEMPTS else "pending",
+                })
+
+        # Failed payments wait for the next scheduled run instead of being retried in a loop
+        remaining = self.search_count([("state", "=", "pending"), ("payment_id", "not in", failed_payment_ids)])
+        _logger.info(
+            "📬 Mollie webhook inbox: %d event(s), %d unique payment(s) processed, %d pending",
+            len(events),
+            len(payment_ids),
+            remaining,
+        )
+        # Lets ir.cron run again right away while the inbox is not empty
+        self.env["ir.cron"]._notify_progress(done=len(events), remaining=remaining)
+        return True
+
+    @api.autovacuum
+    def _gc_processed_events(self):
+        limit_date = fields.Datetime.now() - timedelta(days=7)
+        self.search([("state", "=", "done"), ("processed_at", "<", limit_date)]).unlink()
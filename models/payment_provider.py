@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+from ..tools.mollie_client import get_mollie_client
+from ..tools.mollie_rate_limiter import MollieRateLimiter, bucket_key
+
+
+class PaymentProvider(models.Model):
+    _inherit = "payment.provider"
+
+    def _mollie_recurring_client(self):
+        """Shared, pooled Mollie API client for this provider's API key (None if no key)."""
+        self.ensure_one()
+        if not self.mollie_api_key:
+            return None
+        ICP = self.env["ir.config_parameter"].sudo()
+        base_url = ICP.get_param("mollie_recurring_payments.api_base_url")
+        client = get_mollie_client(self.mollie_api_key, base_url=base_url, dbname=self.env.cr.dbname)
+        if ICP.get_param("mollie_recurring_payments.shared_rate_limit", "1") in ("0", "False", "false"):
+            client.limiter = None
+            return client
+
+        if client.limiter is None:
+            client.limiter = MollieRateLimiter(self.env.cr.dbname, bucket_key(self.mollie_api_key, client.base_url))
+        _workers, rate = self._mollie_recurring_dispatch_settings()
+        try:
+            reserve = float(ICP.get_param("mollie_recurring_payments.rate_limit_reserve", 0.25))
+        except (TypeError, ValueError):
+            reserve = 0.25
+        client.limiter.configure(rate, reserve=min(max(reserve, 0.0), 0.9))
+        return client
+
+    @api.model
+    def _mollie_recurring_providers(self):
+        """Active Mollie providers with an API key: one charging lane each."""
+        providers = self.sudo().search([("code", "=", "mollie"), ("state", "!=", "disabled")])
+        return providers.filtered("mollie_api_key")
+
+    @api.model
+    def _mollie_recurring_provider_for_company(self, company, providers=None):
+        """Mollie provider of ``company``, falling back to the first Mollie provider with a key."""
+        providers = self._mollie_recurring_providers() if providers is None else providers
+        return providers.filtered(lambda p: p.company_id == company)[:1] or providers[:1]
+
+    @api.model
+    def _mollie_recurring_dispatch_settings(self):
+        """Worker pool size and allowed Mollie request rate (requests / second, all workers together) per lane."""
+        ICP = self.env["ir.config_parameter"].sudo()
+        try:
+            workers = int(ICP.get_param("mollie_recurring_payments.charge_workers", 4))
+        except (TypeError, ValueError):
+            workers = 4
+        try:
+            rate = float(ICP.get_param("mollie_recurring_payments.rate_limit", 10))
+        except (TypeError, ValueError):
+            rate = 10.0
+        return max(workers, 1), max(rate, 0.1)
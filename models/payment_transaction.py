@@ -1,55 +1,55 @@
-import requests
 import logging
+
+import requests
+
 from odoo import _, models
 
+from ..tools.mollie_client import MollieAPIError, PRIORITY_INTERACTIVE
+
 _logger = logging.getLogger(__name__)
 
 class PaymentTransaction(models.Model):
     _inherit = 'payment.transaction'
 
     def _mollie_prepare_payment_request_payload(self):
-        """ Override of payment to prepare Mollie payment request payload with subscription support. """
+        """ Override of payment to prepare Mollie payment request payload with subscription support.
+
+        Runs on every website checkout, so it stays off Mollie as much as possible: the
+        customer is normally provisioned in the background when the subscription product
+        is ordered, and the mandate is synced by a background job after payment.
+        """
         payload = super()._mollie_prepare_payment_request_payload()
         partner = self.partner_id
-        
-        mollie_provider = self.env['payment.provider'].search([('code', '=', 'mollie')], limit=1)
-        api_key = mollie_provider.mollie_api_key
-        
-        order = self.env['sale.order'].search([('name', '=', self.reference)], limit=1)
+
+        order = self.sale_order_ids[:1]
         is_subscription_order = any(line.product_id.recurring_invoice for line in order.order_line)
-        
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-        if is_subscription_order:
-            
-            customer_id = partner.mollie_customer_id
-            
-            if not customer_id:
-                customer_payload = {
-                    "name": partner.name,
-                    "email": partner.email,
-                    "metadata": {"odoo_partner_id": partner.id},
-                }
-                resp = requests.post("https://api.mollie.com/v2/customers", json=customer_payload, headers=headers)
-                if resp.status_code == 201:
-                    partner.mollie_customer_id = resp.json().get("id")
-                    customer_id = resp.json().get("id")
-                    _logger.info("Created Mollie customer for %s", partner.name)
-                else:
-                    _logger.error("Customer creation failed: %s", resp.text)
-
-                payload.update({
-                    'sequenceType': 'first',
-                    'customerId': customer_id,
-                })
-
-                partner.action_fetch_mollie_mandate()
-            else:
-                payload.update({
-                    'sequenceType': 'first',
-                    'customerId': customer_id,
-                })
-
-                partner.action_fetch_mollie_mandate()
-              
+        if not is_subscription_order:
+            return payload
+
+        customer_id = partner.mollie_customer_id
+        if not customer_id:
+            # Not provisioned yet (e.g. guest cart): the only Mollie call of this path.
+            # Never block or fail the checkout on it: without budget or on error the
+            # payment goes without customer and the provisioning cron creates it later.
+            client = self.provider_id._mollie_recurring_client()
+            if client and client.has_budget(PRIORITY_INTERACTIVE):
+                try:
+                    customer_id = partner._mollie_create_customer(client)
+                except (MollieAPIError, requests.RequestException) as e:
+                    _logger.warning("Mollie customer creation failed at checkout for %s: %s", partner.name, e)
+            if not customer_id and not partner._mollie_is_public():
+                partner._mollie_schedule_customer_provisioning()
+
+        if customer_id:
+            payload.update({
+                'sequenceType': 'first',
+                'customerId': customer_id,
+            })
+        else:
+            # This payment creates no mandate: make it visible before the first renewal fails
+            order._mollie_flag_missing_mandate()
+
+        # The mandate only exists once the first payment went through
+        partner._mollie_schedule_mandate_sync()
+
         return payload
\ No newline at end of file
@@ -1,9 +1,28 @@
 from odoo import models, fields, api
-import requests
+import itertools
 import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from ..tools.mollie_client import MollieRateLimited, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from ..tools.mollie_dispatcher import MollieDispatcher
 
 _logger = logging.getLogger(__name__)
 
+# Deferred mandate sync: retry after 1, 2, 4, ... minutes (capped), then give up
+MANDATE_SYNC_FIRST_DELAY = 60
+MANDATE_SYNC_MAX_DELAY = 6 * 3600
+MANDATE_SYNC_MAX_ATTEMPTS = 10
+
+# Background customer creation: retry after 5, 10, 20, ... minutes (capped), then give up
+CUSTOMER_PROVISION_FIRST_DELAY = 300
+CUSTOMER_PROVISION_MAX_DELAY = 6 * 3600
+CUSTOMER_PROVISION_MAX_ATTEMPTS = 5
+
+# Partner fields mirrored into mollie.mandate
+MOLLIE_MANDATE_FIELDS = frozenset({"mollie_customer_id", "mollie_mandate_id", "mollie_mandate_status"})
+
+
 class ResPartner(models.Model):
     _inherit = "res.partner"
 
@@ -11,34 +30,354 @@ class ResPartner(models.Model):
     mollie_mandate_id = fields.Char("Mollie Mandate ID", readonly=True)
     mollie_transaction_id = fields.Char("Mollie Transaction ID", readonly=True)
     mollie_mandate_status = fields.Char("Mollie Mandate Status", readonly=True)
-    
+    mollie_mandate_checked_at = fields.Datetime("Mollie Mandate Checked At", readonly=True, index=True)
+    mollie_mandate_sync_due_at = fields.Datetime("Mollie Mandate Sync Due At", readonly=True, index=True)
+    mollie_mandate_sync_attempts = fields.Integer("Mollie Mandate Sync Attempts", readonly=True)
+    mollie_customer_provision_due = fields.Boolean("Mollie Customer To Create", readonly=True, index=True)
+    mollie_customer_provision_due_at = fields.Datetime("Mollie Customer Creation Due At", readonly=True)
+    mollie_customer_provision_attempts = fields.Integer("Mollie Customer Creation Attempts", readonly=True)
+    mollie_mandate_ref_id = fields.Many2one("mollie.mandate", "Mollie Mandate", readonly=True, index="btree_not_null")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        partners = super().create(vals_list)
+        partners.filtered("mollie_mandate_id")._mollie_link_mandates()
+        return partners
+
+    def write(self, vals):
+        res = super().write(vals)
+        if MOLLIE_MANDATE_FIELDS.intersection(vals):
+            self._mollie_link_mandates()
+        return res
+
+    def _mollie_link_mandates(self):
+        """
+        Mirror the current mandate of these partners into mollie.mandate.
+        A status change only updates the mandate row; when the mandate itself
+        changes, every sale order of the partner is pointed at the new one.
+        """
+        mandate_ids = self.env["mollie.mandate"].sudo()._upsert([{
+            "mandate_id": partner.mollie_mandate_id,
+            "customer_id": partner.mollie_customer_id,
+            "partner_id": partner.id,
+            "status": partner.mollie_mandate_status,
+        } for partner in self if partner.mollie_mandate_id])
+
+        partner_ids_by_ref = defaultdict(list)
+        for partner in self:
+            mandate_id = mandate_ids.get(partner.mollie_mandate_id) or False
+            if partner.mollie_mandate_ref_id.id != mandate_id:
+                partner_ids_by_ref[mandate_id].append(partner.id)
+        if not partner_ids_by_ref:
+            return
+        for mandate_id, partner_ids in partner_ids_by_ref.items():
+            self.browse(partner_ids).sudo().write({"mollie_mandate_ref_id": mandate_id})
+        self.browse(itertools.chain.from_iterable(partner_ids_by_ref.values()))._mollie_relink_orders()
+
+    def _mollie_relink_orders(self):
+        """
+        Point every sale order of these partners at their current mandate, quotations
+        and closed orders included: the stored compute on the order only follows
+        partner changes, so a quotation confirmed later must already be up to date.
+        """
+        self.env.flush_all()
+        self.env.cr.execute(
+            """
+            UPDATE sale_order so
+               SET mollie_mandate_ref_id = partner.mollie_mandate_ref_id
+              FROM res_partner partner
+             WHERE so.partner_id = partner.id
+               AND partner.id IN %s
+               AND so.mollie_mandate_ref_id IS DISTINCT FROM partner.mollie_mandate_ref_id
+            """,
+            (tuple(self.ids),),
+        )
+        self.env["sale.order"].invalidate_model(["mollie_mandate_ref_id"])
+
     def action_fetch_mollie_mandate(self):
         """Manually fetch Mollie mandates for this partner."""
-        for partner in self:
-            if not partner.mollie_customer_id:
-                _logger.warning("Partner %s has no Mollie customer ID", partner.name)
-                continue
+        self._mollie_sync_mandates()
+
+    def _mollie_sync_mandates(self):
+        """
+        Fetch the Mollie mandates of these partners and store the result.
+        Returns the partners that have a valid mandate.
+
+        Mandates are fetched concurrently (all pages), one lane per Mollie account under
+        its rate limit; the changes are then applied with one write per distinct set of
+        values.
+        """
+        with_customer = self.filtered("mollie_customer_id")
+        for partner in self - with_customer:
+            _logger.warning("Partner %s has no Mollie customer ID", partner.name)
 
-            mollie_provider = self.env['payment.provider'].search([('code', '=', 'mollie')], limit=1)
-            api_key = mollie_provider.mollie_api_key
-            
-            if not api_key:
+        PaymentProvider = self.env['payment.provider']
+        providers = PaymentProvider._mollie_recurring_providers()
+        workers, rate = PaymentProvider._mollie_recurring_dispatch_settings()
+
+        partner_ids_by_provider = defaultdict(list)
+        for partner in with_customer:
+            provider = PaymentProvider._mollie_recurring_provider_for_company(
+                partner.company_id or self.env.company, providers
+            )
+            partner_ids_by_provider[provider].append(partner.id)
+
+        lane_results = []
+        for provider, partner_ids in partner_ids_by_provider.items():
+            client = provider._mollie_recurring_client() if provider else None
+            if not client:
                 _logger.error("Missing Mollie API key.")
                 continue
+            jobs = [(partner.id, partner.mollie_customer_id) for partner in self.browse(partner_ids)]
+            dispatcher = MollieDispatcher(
+                send=lambda job, client=client: client.list_all(
+                    f"/v2/customers/{job[1]}/mandates", "mandates", timeout=10, priority=PRIORITY_BACKGROUND
+                ),
+                max_workers=workers,
+                rate=rate,
+            )
+            lane_results.append(dispatcher.start(jobs))
+
+        now = fields.Datetime.now()
+        partner_ids_by_vals = defaultdict(list)
+        synced_ids = []
+        mandate_rows = []
+        for result in itertools.chain.from_iterable(lane_results):
+            partner = self.browse(result.job[0])
+            if result.skipped:
+                # Refused by the shared rate limiter: checked again by a later sync
+                continue
+            if result.error:
+                _logger.error("Failed to fetch mandates for %s: %s", partner.name, result.error)
+                continue
+
+            mandates = result.response
+            _logger.debug("Fetched Data %s", mandates)
+            # Every mandate of the customer, so revoked ones are stored with their status too
+            mandate_rows += [{
+                "mandate_id": mandate.get("id"),
+                "customer_id": partner.mollie_customer_id,
+                "partner_id": partner.id,
+                "status": mandate.get("status"),
+                "method": mandate.get("method"),
+            } for mandate in mandates]
+            vals = partner._mollie_mandate_sync_vals(mandates)
+            vals["mollie_mandate_checked_at"] = now
+            if vals.get("mollie_mandate_status") == "valid" or (
+                "mollie_mandate_status" not in vals and partner.mollie_mandate_status == "valid"
+            ):
+                synced_ids.append(partner.id)
+            partner_ids_by_vals[tuple(sorted(vals.items()))].append(partner.id)
+
+        self.env["mollie.mandate"].sudo()._upsert(mandate_rows)
+        for vals, partner_ids in partner_ids_by_vals.items():
+            self.browse(partner_ids).sudo().write(dict(vals))
+
+        return self.browse(synced_ids)
+
+    def _mollie_mandate_sync_vals(self, mandates):
+        """Partner values to write for the list of mandates Mollie returned (only what changed)."""
+        self.ensure_one()
+        vals = {}
+        valid = [m for m in mandates if m.get("status") == "valid"]
+        if valid:
+            if self.mollie_mandate_id != valid[0].get("id") or self.mollie_mandate_status != "valid":
+                vals.update({"mollie_mandate_id": valid[0].get("id"), "mollie_mandate_status": "valid"})
+                _logger.info("Stored valid mandate %s for %s", valid[0].get("id"), self.name)
+        elif self.mollie_mandate_id:
+            # No valid mandate left: reflect the status of the stored one (revoked / deleted => invalid)
+            current = next((m for m in mandates if m.get("id") == self.mollie_mandate_id), {})
+            status = current.get("status") or "invalid"
+            if status != self.mollie_mandate_status:
+                vals["mollie_mandate_status"] = status
+                _logger.info("Mollie mandate %s of %s is now %s", self.mollie_mandate_id, self.name, status)
+        return vals
+
+    @api.model
+    def _cron_sweep_mollie_mandates(self, batch_size=1000):
+        """Revalidate the mandates of every Mollie customer not checked within the threshold."""
+        try:
+            max_age_hours = int(self.env["ir.config_parameter"].sudo().get_param(
+                "mollie_recurring_payments.mandate_sweep_max_age_hours", 24
+            ))
+        except (TypeError, ValueError):
+            max_age_hours = 24
+        now = fields.Datetime.now()
+        domain = [
+            ("mollie_customer_id", "!=", False),
+            "|",
+            ("mollie_mandate_checked_at", "=", False),
+            ("mollie_mandate_checked_at", "<", now - timedelta(hours=max_age_hours)),
+        ]
+        partners = self.sudo().search(domain, limit=batch_size, order="mollie_mandate_checked_at asc nulls first, id")
+        if not partners:
+            return True
+
+        partners._mollie_sync_mandates()
+        checked = partners.filtered(lambda p: p.mollie_mandate_checked_at and p.mollie_mandate_checked_at >= now)
+        failed = partners - checked
+        if failed:
+            # Stamped as well, so failing customers (e.g. deleted ones) move behind the
+            # rest of the queue and are tried again by the next sweep after the threshold
+            failed.write({"mollie_mandate_checked_at": now})
+        remaining = self.sudo().search_count(domain)
+        _logger.info(
+            "🔁 Mollie mandate sweep: %d partner(s) checked, %d failed, %d remaining",
+            len(checked), len(failed), remaining,
+        )
+        self.env["ir.cron"]._notify_progress(done=len(checked), remaining=remaining)
+        return True
+
+    def _mollie_is_public(self):
+        """Partner of the website public user (guest carts): never a Mollie customer."""
+        self.ensure_one()
+        return any(user._is_public() for user in self.with_context(active_test=False).user_ids)
+
+    def _mollie_create_customer(self, client, priority=PRIORITY_INTERACTIVE):
+        """Create the Mollie customer of this partner. Returns the customer id (False on failure)."""
+        self.ensure_one()
+        customer_payload = {
+            "name": self.name,
+            "email": self.email,
+            "metadata": {"odoo_partner_id": self.id},
+        }
+        # May run on customer-facing requests: fail fast instead of waiting out rate limits
+        resp = client.post("/v2/customers", json=customer_payload, max_retries=0, priority=priority)
+        if resp.status_code != 201:
+            _logger.error("Customer creation failed: %s", resp.text)
+            return False
+
+        customer_id = resp.json().get("id")
+        self.sudo().write({
+            "mollie_customer_id": customer_id,
+            "mollie_customer_provision_due": False,
+            "mollie_customer_provision_due_at": False,
+            "mollie_customer_provision_attempts": 0,
+        })
+        _logger.info("Created Mollie customer for %s", self.name)
+        return customer_id
+
+    def _mollie_schedule_customer_provisioning(self):
+        self.sudo().write({
+            "mollie_customer_provision_due": True,
+            "mollie_customer_provision_due_at": False,
+            "mollie_customer_provision_attempts": 0,
+        })
+        cron = self.env.ref("mollie_recurring_payments.cron_mollie_provision_customers", raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    @api.model
+    def _cron_provision_mollie_customers(self, batch_size=100):
+        """Create Mollie customers queued by subscription orders, ahead of checkout."""
+        now = fields.Datetime.now()
+        # Failed creations back off, so they never hold the head of the queue
+        domain = [
+            ("mollie_customer_provision_due", "=", True),
+            "|",
+            ("mollie_customer_provision_due_at", "=", False),
+            ("mollie_customer_provision_due_at", "<=", now),
+        ]
+        partners = self.sudo().search(domain, limit=batch_size, order="mollie_customer_provision_due_at asc nulls first, id")
+        if not partners:
+            return True
+
+        PaymentProvider = self.env["payment.provider"]
+        providers = PaymentProvider._mollie_recurring_providers()
+        failed = self.browse()
+        done = 0
+        for partner in partners:
+            if partner.mollie_customer_id:
+                partner.write({"mollie_customer_provision_due": False, "mollie_customer_provision_attempts": 0})
+                done += 1
+                continue
+            provider = PaymentProvider._mollie_recurring_provider_for_company(
+                partner.company_id or self.env.company, providers
+            )
+            client = provider._mollie_recurring_client() if provider else None
+            try:
+                if not client or not partner._mollie_create_customer(client, priority=PRIORITY_BACKGROUND):
+                    failed |= partner
+                else:
+                    done += 1
+            except MollieRateLimited:
+                # Leave the rest to the next scheduled run instead of re-triggering right away
+                _logger.warning("🛑 Mollie customer provisioning paused by the rate limiter")
+                self.env["ir.cron"]._notify_progress(done=done, remaining=0)
+                return True
+            except Exception:
+                _logger.exception("Mollie customer creation failed for %s", partner.name)
+                failed |= partner
+
+        # Failed partners are retried with backoff (checkout still creates them if needed)
+        for partner in failed:
+            attempts = partner.mollie_customer_provision_attempts + 1
+            if attempts >= CUSTOMER_PROVISION_MAX_ATTEMPTS:
+                _logger.warning("Mollie customer of %s still not created after %d attempts, giving up.", partner.name, attempts)
+                partner.write({
+                    "mollie_customer_provision_due": False,
+                    "mollie_customer_provision_due_at": False,
+                    "mollie_customer_provision_attempts": attempts,
+                })
+                continue
+            delay = min(CUSTOMER_PROVISION_MAX_DELAY, CUSTOMER_PROVISION_FIRST_DELAY * (2 ** (attempts - 1)))
+            partner.write({
+                "mollie_customer_provision_due_at": now + timedelta(seconds=delay),
+                "mollie_customer_provision_attempts": attempts,
+            })
+
+        remaining = self.sudo().search_count(domain)
+        self.env["ir.cron"]._notify_progress(done=done, remaining=remaining)
+        return True
+
+    def _mollie_schedule_mandate_sync(self):
+        """Queue a background mandate sync, once per partner, and wake up the sync cron."""
+        now = fields.Datetime.now()
+        partners = self.filtered(lambda p: not p.mollie_mandate_sync_due_at or p.mollie_mandate_sync_due_at > now)
+        if partners:
+            partners.sudo().write({
+                "mollie_mandate_sync_due_at": now,
+                "mollie_mandate_sync_attempts": 0,
+            })
+        cron = self.env.ref("mollie_recurring_payments.cron_mollie_sync_pending_mandates", raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    @api.model
+    def _cron_sync_pending_mollie_mandates(self, batch_size=100):
+        """Run due deferred mandate syncs, retrying with backoff until the mandate appears."""
+        now = fields.Datetime.now()
+        partners = self.sudo().search([
+            ("mollie_mandate_sync_due_at", "!=", False),
+            ("mollie_mandate_sync_due_at", "<=", now),
+        ], limit=batch_size, order="mollie_mandate_sync_due_at")
+        if not partners:
+            return True
+
+        synced = self.browse()
+        try:
+            synced = partners._mollie_sync_mandates()
+        except Exception:
+            _logger.exception("Deferred Mollie mandate sync failed for %d partner(s)", len(partners))
+
+        if synced:
+            synced.write({"mollie_mandate_sync_due_at": False, "mollie_mandate_sync_attempts": 0})
 
-            headers = {"Authorization": f"Bearer {api_key}"}
-            url = f"https://api.mollie.com/v2/customers/{partner.mollie_customer_id}/mandates"
-            resp = requests.get(url, headers=headers, timeout=10)
-            if resp.status_code != 200:
-                _logger.error("Failed to fetch mandates: %s", resp.text)
+        for partner in partners - synced:
+            attempts = partner.mollie_mandate_sync_attempts + 1
+            if attempts >= MANDATE_SYNC_MAX_ATTEMPTS:
+                _logger.warning("No valid Mollie mandate for %s after %d attempts, giving up.", partner.name, attempts)
+                partner.write({"mollie_mandate_sync_due_at": False, "mollie_mandate_sync_attempts": attempts})
                 continue
+            delay = min(MANDATE_SYNC_MAX_DELAY, MANDATE_SYNC_FIRST_DELAY * (2 ** (attempts - 1)))
+            partner.write({
+                "mollie_mandate_sync_due_at": now + timedelta(seconds=delay),
+                "mollie_mandate_sync_attempts": attempts,
+            })
 
-            data = resp.json().get("_embedded", {}).get("mandates", [])
-            _logger.info("Fetched Data %s", data)
-            valid = [m for m in data if m.get("status") == "valid"]
-            if valid:
-                partner.sudo().write({"mollie_mandate_id": valid[0].get("id")})
-                partner.sudo().write({"mollie_mandate_status": valid[0].get("status")})
-                _logger.info("Stored valid mandate %s for %s", valid[0].get("id"), partner.name)
-                
-                self.env['res.partner'].flush_model()
+        remaining = self.sudo().search_count([
+            ("mollie_mandate_sync_due_at", "!=", False),
+            ("mollie_mandate_sync_due_at", "<=", now),
+        ])
+        self.env["ir.cron"]._notify_progress(done=len(partners), remaining=remaining)
+        return True
@@ -1,49 +1,130 @@
 # -*- coding: utf-8 -*-
-from odoo import models, api, fields
-import requests
+from odoo import models, api, fields, tools
 import logging
-import time
+import re
+from collections import defaultdict
+from datetime import timedelta
 from dateutil import parser as date_parser
+from markupsafe import Markup
+
+from .mollie_renewal_summary import MOLLIE_SUMMARY_FIELDS
+from ..tools.mollie_client import MollieRateLimited, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from ..tools.mollie_dispatcher import MollieDispatcher
 
 _logger = logging.getLogger(__name__)
 
+# Largest page size accepted by Mollie list endpoints
+MOLLIE_LIST_PAGE_SIZE = 250
+
+# Subscription fields that block charging when set / when containing a blocked keyword
+MOLLIE_BLOCKED_BOOLEAN_FIELDS = ("is_paused", "paused", "subscription_paused", "to_close", "is_closed")
+MOLLIE_BLOCKED_TEXT_FIELDS = ("subscription_state", "subscription_status", "stage_category", "state")
+MOLLIE_EXCLUDED_STATES = ("churn", "churned", "closed", "cancelled", "canceled", "done", "paused", "pause")
+
+# Payment statuses that can no longer change: never polled again
+MOLLIE_TERMINAL_STATUSES = ("paid", "failed", "expired", "canceled")
+
+# Status check backoff per payment method: (first delay, max delay) in seconds.
+# iDEAL / cards settle within seconds or minutes, SEPA direct debit takes days.
+MOLLIE_STATUS_CHECK_BACKOFF = {
+    "ideal": (60, 3600),
+    "creditcard": (300, 6 * 3600),
+    "paypal": (300, 6 * 3600),
+    "bancontact": (300, 6 * 3600),
+    "directdebit": (6 * 3600, 2 * 86400),
+    "banktransfer": (86400, 3 * 86400),
+}
+MOLLIE_STATUS_CHECK_BACKOFF_DEFAULT = (900, 12 * 3600)
+
+
+def _mollie_list_recent_payments(client, payment_ids, window_start):
+    """
+    Walk the payments list of ``client``'s Mollie account, newest first, until every
+    payment of ``payment_ids`` was seen or the pages leave the window starting at
+    ``window_start``. Runs in a dispatcher thread: never touches the environment.
+
+    Return ``(payments, pages, rate_limited)``; a page that cannot be fetched ends the
+    walk with what was listed so far.
+    """
+    pending = set(payment_ids)
+    payments = []
+    pages = 0
+    next_url = "/v2/payments"
+    params = {"limit": MOLLIE_LIST_PAGE_SIZE}
+    while next_url and pending:
+        try:
+            resp = client.get(next_url, params=params, priority=PRIORITY_BACKGROUND)
+        except MollieRateLimited as e:
+            # Payments listed so far are still applied, the rest waits for the next run
+            _logger.warning("🛑 Mollie bulk refresh stopped: %s", e)
+            return payments, pages, True
+        except Exception:
+            _logger.exception("⚠️ Mollie payments list exception, falling back to per-payment refresh")
+            break
+        if resp is None or resp.status_code != 200:
+            _logger.warning(
+                "⚠️ Mollie payments list failed (%s), falling back to per-payment refresh",
+                resp.text if resp is not None else "No response",
+            )
+            break
+
+        pages += 1
+        body = resp.json() if resp.content else {}
+        page = (body.get("_embedded") or {}).get("payments") or []
+        payments += page
+        oldest_created_at = None
+        for data in page:
+            pending.discard(data.get("id"))
+            created_at_str = data.get("createdAt")
+            if created_at_str:
+                try:
+                    oldest_created_at = date_parser.isoparse(created_at_str).replace(tzinfo=None)
+                except Exception:
+                    pass
+
+        if oldest_created_at and oldest_created_at < window_start:
+            break
+        next_url = ((body.get("_links") or {}).get("next") or {}).get("href")
+        # The next link already carries the pagination parameters
+        params = None
+    return payments, pages, False
+
 
 class SaleOrder(models.Model):
     _inherit = "sale.order"
 
     # -------------------------------------------------------------------------
-    # Stored related fields for domain filters
+    # Mollie customer and mandate
     # -------------------------------------------------------------------------
+    # Only the mandate reference is stored: a mandate status change updates one
+    # mollie.mandate row instead of every order of the customer.
+    mollie_mandate_ref_id = fields.Many2one(
+        "mollie.mandate",
+        string="Mollie Mandate",
+        compute="_compute_mollie_mandate_ref_id",
+        store=True,
+        readonly=True,
+        index="btree_not_null",
+    )
+
     mollie_customer_id = fields.Char(
         string="Mollie Customer ID",
         related="partner_id.mollie_customer_id",
-        store=True,
-        readonly=True,
-        index=True,
     )
 
     mollie_mandate_id = fields.Char(
         string="Mollie Mandate ID",
-        related="partner_id.mollie_mandate_id",
-        store=True,
-        readonly=True,
-        index=True,
+        related="mollie_mandate_ref_id.mandate_id",
     )
 
     mollie_transaction_id = fields.Char(
         string="Mollie Transaction ID",
         related="partner_id.mollie_transaction_id",
-        store=True,
-        readonly=True,
-        index=True,
     )
 
     mollie_mandate_status = fields.Char(
         string="Mollie Mandate Status",
-        related="partner_id.mollie_mandate_status",
-        store=True,
-        readonly=True,
-        index=True,
+        related="mollie_mandate_ref_id.status",
     )
 
     subscription_type = fields.Selection(
@@ -60,16 +141,28 @@ class SaleOrder(models.Model):
     partner_email = fields.Char(
         string="Email",
         related="partner_id.email",
-        store=True,
-        readonly=True,
-        index=True,
     )
 
+    # Latest row of the payment ledger; the mollie_last_payment_* columns below are
+    # written from the same observation and kept for SQL filters and the dashboard.
+    mollie_last_payment_event_id = fields.Many2one(
+        "mollie.payment.event",
+        string="Last Mollie Payment Event",
+        readonly=True,
+        copy=False,
+        index="btree_not_null",
+    )
     mollie_last_payment_status = fields.Char(string="Last Mollie Payment Status", readonly=True, index=True)
     mollie_last_payment_paid = fields.Boolean(string="Paid", readonly=True, index=True)
     mollie_last_payment_amount = fields.Monetary(string="Paid Amount", currency_field="currency_id", readonly=True)
     mollie_last_payment_paid_at = fields.Datetime(string="Paid At", readonly=True, index=True)
     mollie_last_payment_checked_at = fields.Datetime(string="Status Checked At", readonly=True)
+    mollie_next_status_check_at = fields.Datetime(string="Next Status Check", readonly=True, index=True)
+    mollie_status_check_count = fields.Integer(
+        string="Unchanged Status Checks",
+        readonly=True,
+        help="Consecutive status checks without a status change, drives the polling backoff.",
+    )
 
     mollie_last_payment_unpaid_since = fields.Datetime(
         string="Unpaid Since",
@@ -77,6 +170,12 @@ class SaleOrder(models.Model):
         index=True,
     )
 
+    @api.depends("partner_id")
+    def _compute_mollie_mandate_ref_id(self):
+        # Later mandate changes are propagated by res.partner._mollie_relink_orders()
+        for order in self:
+            order.mollie_mandate_ref_id = order.partner_id.mollie_mandate_ref_id
+
     # -------------------------------------------------------------------------
     # Helpers
     # -------------------------------------------------------------------------
@@ -84,55 +183,116 @@ class SaleOrder(models.Model):
         """Check if this sale order includes subscription products."""
         return any(line.product_id.recurring_invoice for line in self.order_line)
 
+    def _mollie_mark_summary_dirty(self):
+        """Queue a renewal summary refresh of the renewal dates of these subscriptions."""
+        renewal_dates = set(self.filtered("plan_id").mapped("next_invoice_date"))
+        if renewal_dates:
+            self.env["mollie.renewal.summary"]._mark_dirty(renewal_dates)
+
+    def _mollie_flag_missing_mandate(self):
+        """The first payment of these subscriptions went to Mollie without customer, so without mandate."""
+        for order in self.sudo():
+            order.message_post(body=(
+                "⚠️ First payment sent to Mollie without a Mollie customer: no mandate was created "
+                "and renewals cannot be charged until the customer sets one up."
+            ))
+            order.activity_schedule(
+                "mail.mail_activity_data_todo",
+                summary="Ask the customer for a Mollie mandate",
+                user_id=order.user_id.id or self.env.uid,
+            )
+
     def _get_blocked_subscription_keywords(self):
         return ["churn", "closed", "cancel", "pause", "hold", "stop"]
 
-    def _safe_text_contains_blocked_status(self, value):
-        value = (value or "").strip().lower()
-        if not value:
-            return False
-        return any(keyword in value for keyword in self._get_blocked_subscription_keywords())
+    @api.model
+    @tools.ormcache()
+    def _mollie_charge_eligibility_spec(self):
+        """
+        Field-dependent part of the charge eligibility rules, compiled once per registry load.
 
-    def _is_subscription_charge_blocked(self):
+        Returns ``(boolean_fields, text_fields, stage_fields, exclusion_domain, blocked_pattern)``:
+        the blocking fields that exist on this database, the SQL-side exclusion domain built
+        from them, and a regex matching the blocked keywords.
         """
-        Extra runtime safety check.
-        Stops churned / paused / closed / cancelled subscriptions from being sent to Mollie
-        even if domain filters miss some customization/version-specific field.
+        order_fields = self._fields
+        boolean_fields = tuple(f for f in MOLLIE_BLOCKED_BOOLEAN_FIELDS if f in order_fields)
+        text_fields = tuple(f for f in MOLLIE_BLOCKED_TEXT_FIELDS if f in order_fields)
+
+        stage_fields = ()
+        if "stage_id" in order_fields:
+            Stage = self.env[order_fields["stage_id"].comodel_name]
+            stage_fields = tuple(f for f in ("name", "category", "code") if f in Stage._fields)
+
+        exclusion_domain = []
+        for field_name in ("subscription_state", "subscription_status", "stage_category"):
+            if field_name in order_fields:
+                exclusion_domain.append((field_name, "not in", list(MOLLIE_EXCLUDED_STATES)))
+        if "is_subscription" in order_fields:
+            exclusion_domain.append(("is_subscription", "=", True))
+        for field_name in boolean_fields:
+            exclusion_domain.append((field_name, "=", False))
+
+        blocked_pattern = re.compile(
+            "|".join(re.escape(keyword) for keyword in self._get_blocked_subscription_keywords())
+        )
+        return boolean_fields, text_fields, stage_fields, tuple(exclusion_domain), blocked_pattern
+
+    def _mollie_screen_blocked_orders(self):
         """
-        self.ensure_one()
+        Extra runtime safety check, evaluated on the whole batch.
+        Returns the orders that must not be sent to Mollie (churned / paused / closed /
+        cancelled) even if domain filters miss some customization/version-specific field.
 
-        blocked_boolean_fields = [
-            "is_paused",
-            "paused",
-            "subscription_paused",
-            "to_close",
-            "is_closed",
-        ]
-        for field_name in blocked_boolean_fields:
-            if field_name in self._fields and bool(self[field_name]):
-                return True
-
-        blocked_text_fields = [
-            "subscription_state",
-            "subscription_status",
-            "stage_category",
-            "state",
+        Orders are read in one query and their stages in another, instead of one lazy
+        load per order.
+        """
+        if not self:
+            return self
+        boolean_fields, text_fields, stage_fields, _domain, blocked_pattern = self._mollie_charge_eligibility_spec()
+
+        def is_blocked_text(value):
+            return bool(value) and bool(blocked_pattern.search(str(value).strip().lower()))
+
+        self.fetch(list(boolean_fields + text_fields) + (["stage_id"] if stage_fields else []))
+        stage_blocked = {}
+        if stage_fields:
+            for stage in self.stage_id.read(list(stage_fields)):
+                stage_text = " ".join(str(stage[f]) for f in stage_fields if stage[f])
+                stage_blocked[stage["id"]] = is_blocked_text(stage_text)
+
+        blocked_ids = [
+            order.id
+            for order in self
+            if any(order[f] for f in boolean_fields)
+            or any(is_blocked_text(order[f]) for f in text_fields)
+            or (stage_fields and stage_blocked.get(order.stage_id.id, False))
         ]
-        for field_name in blocked_text_fields:
-            if field_name in self._fields and self._safe_text_contains_blocked_status(self[field_name]):
-                return True
-
-        if "stage_id" in self._fields and self.stage_id:
-            stage_parts = [
-                getattr(self.stage_id, "name", ""),
-                getattr(self.stage_id, "category", ""),
-                getattr(self.stage_id, "code", ""),
-            ]
-            stage_text = " ".join([part for part in stage_parts if part])
-            if self._safe_text_contains_blocked_status(stage_text):
-                return True
+        return self.browse(blocked_ids)
 
-        return False
+    def _is_subscription_charge_blocked(self):
+        """Single-order variant of _mollie_screen_blocked_orders()."""
+        self.ensure_one()
+        return bool(self._mollie_screen_blocked_orders())
+
+    def _mollie_group_by_provider(self):
+        """
+        Partition orders into lanes, one per Mollie account: ``[(provider, orders)]``.
+        Orders follow the Mollie provider of their company; provider is empty when
+        no Mollie provider with an API key exists.
+        """
+        PaymentProvider = self.env["payment.provider"]
+        providers = PaymentProvider._mollie_recurring_providers()
+        provider_by_company = {}
+        order_ids_by_provider = defaultdict(list)
+        for order in self:
+            company = order.company_id
+            if company.id not in provider_by_company:
+                provider_by_company[company.id] = PaymentProvider._mollie_recurring_provider_for_company(
+                    company, providers
+                )
+            order_ids_by_provider[provider_by_company[company.id]].append(order.id)
+        return [(provider, self.browse(ids)) for provider, ids in order_ids_by_provider.items()]
 
     def _mollie_subscription_base_domain(self, today=None):
         today = today or fields.Date.today()
@@ -140,117 +300,45 @@ class SaleOrder(models.Model):
             ("plan_id", "!=", False),
             ("next_invoice_date", "=", today),
             ("state", "in", ["sale", "done"]),
-            ("partner_id.mollie_mandate_id", "!=", False),
-            ("partner_id.mollie_mandate_status", "=", "valid"),
+            ("mollie_mandate_ref_id.status", "=", "valid"),
         ]
+        return domain + list(self._mollie_charge_eligibility_spec()[3])
 
-        exclude_states = ["churn", "churned", "closed", "cancelled", "canceled", "done", "paused", "pause"]
-
-        if "subscription_state" in self._fields:
-            domain += [("subscription_state", "not in", exclude_states)]
-        if "subscription_status" in self._fields:
-            domain += [("subscription_status", "not in", exclude_states)]
-        if "stage_category" in self._fields:
-            domain += [("stage_category", "not in", exclude_states)]
-        if "is_subscription" in self._fields:
-            domain += [("is_subscription", "=", True)]
-        if "is_paused" in self._fields:
-            domain += [("is_paused", "=", False)]
-        if "paused" in self._fields:
-            domain += [("paused", "=", False)]
-        if "subscription_paused" in self._fields:
-            domain += [("subscription_paused", "=", False)]
-        if "to_close" in self._fields:
-            domain += [("to_close", "=", False)]
-        if "is_closed" in self._fields:
-            domain += [("is_closed", "=", False)]
-
-        return domain
-
-    def _mollie_subscription_status_refresh_domain(self):
+    def _mollie_subscription_status_refresh_domain(self, now=None):
+        """Orders with an in-flight Mollie payment whose next status check is due."""
+        now = now or fields.Datetime.now()
         domain = [
             ("last_payment_id", "!=", False),
             ("plan_id", "!=", False),
             ("state", "in", ["sale", "done"]),
+            ("mollie_last_payment_status", "not in", list(MOLLIE_TERMINAL_STATUSES)),
+            "|",
+            ("mollie_next_status_check_at", "=", False),
+            ("mollie_next_status_check_at", "<=", now),
         ]
-
-        exclude_states = ["churn", "churned", "closed", "cancelled", "canceled", "done", "paused", "pause"]
-
-        if "subscription_state" in self._fields:
-            domain += [("subscription_state", "not in", exclude_states)]
-        if "subscription_status" in self._fields:
-            domain += [("subscription_status", "not in", exclude_states)]
-        if "stage_category" in self._fields:
-            domain += [("stage_category", "not in", exclude_states)]
-        if "is_subscription" in self._fields:
-            domain += [("is_subscription", "=", True)]
-        if "is_paused" in self._fields:
-            domain += [("is_paused", "=", False)]
-        if "paused" in self._fields:
-            domain += [("paused", "=", False)]
-        if "subscription_paused" in self._fields:
-            domain += [("subscription_paused", "=", False)]
-        if "to_close" in self._fields:
-            domain += [("to_close", "=", False)]
-        if "is_closed" in self._fields:
-            domain += [("is_closed", "=", False)]
-
-        return domain
-
-    def _mollie_api_request(self, method, url, headers=None, json=None, timeout=15, max_retries=3):
-        """
-        Wrapper for Mollie API calls with 429 retry handling.
-        """
-        headers = headers or {}
-        last_response = None
-
-        for attempt in range(max_retries + 1):
-            try:
-                response = requests.request(
-                    method=method,
-                    url=url,
-                    headers=headers,
-                    json=json,
-                    timeout=timeout,
-                )
-                last_response = response
-
-                if response.status_code != 429:
-                    return response
-
-                retry_after = response.headers.get("Retry-After")
-                try:
-                    wait_seconds = int(retry_after) if retry_after else 60
-                except Exception:
-                    wait_seconds = 60
-
-                _logger.warning(
-                    "⚠️ Mollie rate limit hit on %s %s. Attempt %s/%s. Waiting %s seconds.",
-                    method,
-                    url,
-                    attempt + 1,
-                    max_retries + 1,
-                    wait_seconds,
-                )
-
-                if attempt >= max_retries:
-                    return response
-
-                time.sleep(wait_seconds)
-
-            except requests.RequestException:
-                if attempt >= max_retries:
-                    raise
-                wait_seconds = 5 * (attempt + 1)
-                _logger.warning(
-                    "⚠️ Mollie request exception on %s %s. Retrying in %s seconds.",
-                    method,
-                    url,
-                    wait_seconds,
-                )
-                time.sleep(wait_seconds)
-
-        return last_response
+        return domain + list(self._mollie_charge_eligibility_spec()[3])
+
+    def write(self, vals):
+        summary_dates = None
+        if MOLLIE_SUMMARY_FIELDS.intersection(vals):
+            # Renewal dates before and after the write: both summary rows change
+            summary_dates = set(self.filtered("plan_id").mapped("next_invoice_date"))
+        res = super().write(vals)
+        if "partner_id" in vals:
+            # e.g. a guest cart assigned to the customer after login
+            self.order_line._mollie_queue_customer_provisioning()
+        if summary_dates is not None:
+            summary_dates.update(self.filtered("plan_id").mapped("next_invoice_date"))
+            if summary_dates:
+                self.env["mollie.renewal.summary"]._mark_dirty(summary_dates)
+        if "mollie_last_payment_status" in vals:
+            # Only the invoice charged by each payment follows its status
+            self.env["account.move"]._mollie_queue_invoice_status({
+                payment_id: vals["mollie_last_payment_status"]
+                for payment_id in self.mapped("last_payment_id")
+                if payment_id
+            })
+        return res
 
     # -------------------------------------------------------------------------
     # Confirm flow: fetch mandate after confirm
@@ -258,22 +346,17 @@ class SaleOrder(models.Model):
     def action_confirm(self):
         res = super().action_confirm()
 
-        for order in self:
-            if not order._is_subscription_order():
-                _logger.info("Order %s is not a subscription order. Skipping Mollie mandate creation.", order.name)
-                continue
-
-            mollie_provider = self.env["payment.provider"].search([("code", "=", "mollie")], limit=1)
-            api_key = mollie_provider.mollie_api_key if mollie_provider else False
-
-            if not api_key:
-                _logger.error("Missing Mollie API key.")
-                continue
+        subscription_orders = self.filtered(lambda order: order._is_subscription_order())
+        for order in self - subscription_orders:
+            _logger.info("Order %s is not a subscription order. Skipping Mollie mandate creation.", order.name)
 
-            partner = order.partner_id
-            time.sleep(5)
-            partner.action_fetch_mollie_mandate()
-            _logger.info("Fetched Mollie mandate for partner %s", partner.name)
+        # The mandate usually appears on Mollie's side a little after confirmation:
+        # sync it in the background (once per partner) instead of blocking the confirm.
+        if subscription_orders:
+            subscription_orders.partner_id._mollie_schedule_mandate_sync()
+            _logger.info(
+                "Queued Mollie mandate sync for %d partner(s)", len(subscription_orders.partner_id)
+            )
 
         return res
 
@@ -282,174 +365,374 @@ class SaleOrder(models.Model):
     # -------------------------------------------------------------------------
     @api.model
     def _cron_recurring_create_invoice(self):
-        today = fields.Date.today()
-        orders = self.search(self._mollie_subscription_base_domain(today=today))
+        if not self.env["payment.provider"]._mollie_recurring_providers():
+            _logger.error("❌ Mollie API key is missing")
+            return super()._cron_recurring_create_invoice()
 
-        if not orders:
-            _logger.info("✅ No subscription payments due for today (%s)", today)
-            return True
+        # Charges go through a checkpointed run per billing day (see mollie.charge.run):
+        # interrupted runs resume where they stopped, without charging anyone twice.
+        return self.env["mollie.charge.run"]._cron_process_charge_runs()
+
+    def _mollie_recurring_payment_payload(self, charge_key=None):
+        """Mollie payment payload charging this order's renewal on the customer's mandate."""
+        self.ensure_one()
+        partner = self.partner_id
+        amount = round(self.amount_total, 2)
+        metadata = {"order_id": self.id}
+        if charge_key:
+            # Lets an interrupted run find the payment again once the Idempotency-Key expired
+            metadata["charge_key"] = charge_key
+        return {
+            "amount": {"currency": "EUR", "value": f"{amount:.2f}"},
+            "customerId": partner.mollie_customer_id,
+            "mandateId": self.mollie_mandate_ref_id.mandate_id or partner.mollie_mandate_id,
+            "description": f"Subscription renewal for {self.name}",
+            "sequenceType": "recurring",
+            "metadata": metadata,
+        }
 
-        _logger.info("📦 Found %d subscription(s) due for payment", len(orders))
+    def _prepare_invoice(self):
+        vals = super()._prepare_invoice()
+        # Set while invoicing charged renewals: links the invoice to the Mollie payment paying it
+        payment_id = (self.env.context.get("mollie_charge_payments") or {}).get(self.id)
+        if payment_id:
+            vals["mollie_payment_id"] = payment_id
+        return vals
 
-        mollie_provider = self.env["payment.provider"].search([("code", "=", "mollie")], limit=1)
-        if not mollie_provider or not mollie_provider.mollie_api_key:
-            _logger.error("❌ Mollie API key is missing")
-            return super()._cron_recurring_create_invoice()
+    def _mollie_invoice_charged_orders(self, payment_by_order=None):
+        """
+        Create the renewal invoices of orders charged on Mollie (official subscription cron).
 
-        headers = {
-            "Authorization": f"Bearer {mollie_provider.mollie_api_key}",
-            "Content-Type": "application/json",
+        :param payment_by_order: ``{order_id: payment_id}`` of the charges, defaults to
+            each order's ``last_payment_id``. Stored on the invoices as ``mollie_payment_id``.
+        """
+        if not self:
+            return
+        if payment_by_order is None:
+            payment_by_order = {order.id: order.last_payment_id for order in self if order.last_payment_id}
+        _logger.info("🧾 Creating invoices for %d successfully charged subscription(s)", len(self))
+        super(SaleOrder, self.with_context(mollie_charge_payments=payment_by_order))._cron_recurring_create_invoice()
+
+        AccountMove = self.env["account.move"].sudo()
+        invoice_by_payment = {
+            invoice.mollie_payment_id: invoice
+            for invoice in AccountMove.search([("mollie_payment_id", "in", list(payment_by_order.values()))])
         }
+        for order in self:
+            payment_id = payment_by_order.get(order.id)
+            if not payment_id:
+                continue
+            invoice = invoice_by_payment.get(payment_id)
+            if not invoice:
+                continue
+            invoice.mollie_last_payment_status = order.mollie_last_payment_status
+            self.env["mollie.charge.run"]._queue_note(
+                invoice, Markup("💳 Paid via Mollie Subscription<br/>Payment ID: <b>%s</b>") % payment_id
+            )
 
-        charged_orders = self.env["sale.order"]
+    # -------------------------------------------------------------------------
+    # Manual + webhook + cron refresh payment status
+    # -------------------------------------------------------------------------
+    def action_refresh_last_mollie_payment_status(self):
+        """Fetch last payment status from Mollie and apply accounting when paid."""
+        self._mollie_refresh_payment_status()
 
-        for index, order in enumerate(orders, start=1):
-            if order._is_subscription_charge_blocked():
-                _logger.info("⏭️ Skipping blocked subscription order %s", order.name)
-                order.message_post(body="⏭️ Skipped Mollie export because subscription is churned / paused / closed.")
+    def _mollie_refresh_payment_status(self, priority=PRIORITY_INTERACTIVE):
+        """
+        Per-payment status refresh; cron callers pass the background ``priority``.
+
+        Payments still fresh in the cache are applied as is. The others are fetched
+        concurrently, one lane per Mollie account under its rate limit, all lanes in
+        parallel; the payloads are then applied in this thread.
+        """
+        PaymentCache = self.env["mollie.payment.cache"].sudo()
+        workers, rate = self.env["payment.provider"]._mollie_recurring_dispatch_settings()
+        orders = self.filtered("last_payment_id")
+        cached = PaymentCache._get_cached_payments(orders.mapped("last_payment_id"))
+
+        lanes = []
+        for provider, lane_orders in orders._mollie_group_by_provider():
+            client = provider._mollie_recurring_client() if provider else None
+            if not client:
                 continue
+            jobs = [(order.id, order.last_payment_id) for order in lane_orders if order.last_payment_id not in cached]
+            dispatcher = MollieDispatcher(
+                send=lambda job, client=client: client.get(f"/v2/payments/{job[1]}", priority=priority),
+                max_workers=workers,
+                rate=rate,
+            )
+            # Started now so that all lanes fetch in parallel
+            lanes.append((lane_orders, dispatcher.start(jobs)))
+
+        paid_entries = []
+        for lane_orders, results in lanes:
+            for order in lane_orders:
+                if order.last_payment_id in cached:
+                    order._mollie_apply_refreshed_payment(cached[order.last_payment_id], paid_entries)
+
+            postponed = 0
+            for result in results:
+                order = self.browse(result.job[0])
+                payment_id = result.job[1]
+                if result.skipped:
+                    # Refused by the shared rate limiter: keeps its schedule, picked up by the next run
+                    postponed += 1
+                    continue
+                if result.error:
+                    _logger.error("⚠️ Mollie status exception for order %s: %s", order.name, result.error)
+                    order.message_post(body=f"⚠️ Mollie status exception: {result.error}")
+                    continue
+                resp = result.response
+                if resp is None or resp.status_code != 200:
+                    error = resp.text if resp is not None else "No response"
+                    order.message_post(body=f"⚠️ Mollie status fetch failed for {payment_id}: {error}")
+                    continue
+                data = resp.json() if resp.content else {}
+                PaymentCache._store_payments([data])
+                order._mollie_apply_refreshed_payment(data, paid_entries)
+            if postponed:
+                _logger.warning("🛑 Mollie status refresh stopped by rate limiting, %d order(s) left for the next run", postponed)
+
+        self._process_mollie_payments_success_batch(paid_entries)
+
+    def _mollie_apply_refreshed_payment(self, data, paid_entries):
+        """_mollie_apply_payment_data() for a refresh: a failure is reported on the order, not raised."""
+        self.ensure_one()
+        try:
+            self._mollie_apply_payment_data(data, paid_entries)
+        except Exception as e:
+            _logger.exception("⚠️ Mollie status exception for order %s", self.name)
+            self.message_post(body=f"⚠️ Mollie status exception: {e}")
+            return False
+        return True
 
-            partner = order.partner_id
-            amount = round(order.amount_total, 2)
+    def _mollie_next_status_check_at(self, method=None, check_count=0, now=None):
+        """When to poll an in-flight payment again, backing off per payment method."""
+        now = now or fields.Datetime.now()
+        first_delay, max_delay = MOLLIE_STATUS_CHECK_BACKOFF.get(method or "", MOLLIE_STATUS_CHECK_BACKOFF_DEFAULT)
+        delay = min(max_delay, first_delay * (2 ** min(check_count, 16)))
+        return now + timedelta(seconds=delay)
+
+    def _mollie_payment_event_vals(self, payment_id, status, amount=0.0, method=None, paid_at=False):
+        """
+        Append the ``(payment_id, status)`` transition to the payment ledger when it is new
+        for this order, and return the order values pointing at its row.
+        """
+        self.ensure_one()
+        event = self.mollie_last_payment_event_id
+        if not payment_id or not status or (event.payment_id == payment_id and event.status == status):
+            return {}
+        event_ids = self.env["mollie.payment.event"].sudo()._record([{
+            "payment_id": payment_id,
+            "status": status,
+            "order_id": self.id,
+            "partner_id": self.partner_id.id,
+            "company_id": self.company_id.id,
+            "currency_id": self.currency_id.id,
+            "amount": amount,
+            "method": method,
+            "paid_at": paid_at,
+        }])
+        event_id = event_ids.get((payment_id, status))
+        return {"mollie_last_payment_event_id": event_id} if event_id else {}
+
+    def _mollie_apply_payment_data(self, data, paid_entries=None):
+        """
+        Store a Mollie payment payload on the order and apply accounting when paid.
 
-            payload = {
-                "amount": {"currency": "EUR", "value": f"{amount:.2f}"},
-                "customerId": partner.mollie_customer_id,
-                "mandateId": partner.mollie_mandate_id,
-                "description": f"Subscription renewal for {order.name}",
-                "sequenceType": "recurring",
-                "metadata": {"order_id": order.id},
-            }
+        When ``paid_entries`` is a list, the accounting step is not run but appended to it
+        as ``(order, payment_id, amount)`` for _process_mollie_payments_success_batch().
+        """
+        self.ensure_one()
+        payment_id = self.last_payment_id
+        status = data.get("status")
+        paid = True if status == "paid" else False
+        now = fields.Datetime.now()
 
-            _logger.info("💳 Charging %s for %s EUR (Order %s)", partner.name, amount, order.name)
+        amount_value = 0.0
+        try:
+            amount_value = float((data.get("amount") or {}).get("value") or 0.0)
+        except Exception:
+            amount_value = 0.0
 
+        paid_at = False
+        paid_at_str = data.get("paidAt") or data.get("authorizedAt") or data.get("createdAt")
+        if paid_at_str:
             try:
-                response = order._mollie_api_request(
-                    method="POST",
-                    url="https://api.mollie.com/v2/payments",
-                    json=payload,
-                    headers=headers,
-                    timeout=15,
-                    max_retries=3,
-                )
-                data = response.json() if response and response.content else {}
+                paid_at = date_parser.isoparse(paid_at_str).replace(tzinfo=None)
+            except Exception:
+                paid_at = False
 
-                if not response or response.status_code != 201:
-                    order.message_post(body=f"❌ Mollie payment failed: {data}")
-                    _logger.error("❌ Mollie payment failed for %s: %s", order.name, data)
+        vals = self._mollie_payment_event_vals(
+            payment_id, status, amount=amount_value, method=data.get("method"), paid_at=paid_at
+        )
+        if vals and status == "failed":
+            # First time this failure is seen: queue the retry of the charge
+            self.env["mollie.charge.retry"].sudo()._schedule_for_failed_payment(payment_id, data)
+        vals.update({
+            "mollie_last_payment_status": status,
+            "mollie_last_payment_paid": paid,
+            "mollie_last_payment_amount": amount_value,
+            "mollie_last_payment_paid_at": paid_at,
+            "mollie_last_payment_checked_at": now,
+        })
+
+        if status in MOLLIE_TERMINAL_STATUSES:
+            vals["mollie_next_status_check_at"] = False
+            vals["mollie_status_check_count"] = 0
+        else:
+            check_count = self.mollie_status_check_count + 1 if status == self.mollie_last_payment_status else 0
+            vals["mollie_status_check_count"] = check_count
+            vals["mollie_next_status_check_at"] = self._mollie_next_status_check_at(
+                method=data.get("method"), check_count=check_count, now=now
+            )
 
-                    # If Mollie is still rate-limiting after retries, stop loop cleanly
-                    if response and response.status_code == 429:
-                        _logger.warning("🛑 Stopping current batch due to Mollie 429 after retries.")
-                        break
-                    continue
+        if paid:
+            vals["mollie_last_payment_unpaid_since"] = False
+            if paid_entries is not None:
+                paid_entries.append((self, payment_id, amount_value))
+            else:
+                self._process_mollie_payment_success(payment_id, amount_value)
+        else:
+            if not self.mollie_last_payment_unpaid_since:
+                vals["mollie_last_payment_unpaid_since"] = now
 
-                payment_id = data.get("id")
-                order.message_post(
-                    body=f"✅ Subscription payment exported to Mollie : <br/>Payment ID: <b>{payment_id}</b>"
-                )
+        self.sudo().write(vals)
 
-                order.sudo().write({
-                    "last_payment_id": payment_id,
-                    "mollie_last_payment_unpaid_since": False,
-                    "mollie_last_payment_paid": False,
-                    "mollie_last_payment_status": "open",
-                })
-                charged_orders |= order
-
-                # Small delay to reduce burst requests
-                if index < len(orders):
-                    time.sleep(2)
-
-            except Exception as e:
-                _logger.exception("⚠️ Mollie exception for %s", order.name)
-                order.message_post(body=f"⚠️ Mollie exception: {e}")
-
-        if charged_orders:
-            _logger.info("🧾 Creating invoices for %d successfully charged subscription(s)", len(charged_orders))
-            super(SaleOrder, charged_orders)._cron_recurring_create_invoice()
-
-            for order in charged_orders:
-                invoice = order.invoice_ids.sorted("id", reverse=True)[:1]
-                if invoice:
-                    invoice.message_post(
-                        body=f"💳 Paid via Mollie Subscription<br/>Payment ID: <b>{order.last_payment_id}</b>"
-                    )
+    @api.model
+    def _mollie_process_subscription_webhook_payment(self, payment_id, payment_data):
+        """
+        Apply a verified Mollie payment payload received through the subscription webhook.
+        Returns the matched order (empty recordset if none).
+        """
+        status = payment_data.get("status")
+        metadata = payment_data.get("metadata") or {}
+        meta_order_id = metadata.get("order_id")
 
-        return True
+        _logger.info("Subscription webhook payment_id=%s status=%s metadata=%s", payment_id, status, metadata)
 
-    # -------------------------------------------------------------------------
-    # Manual + webhook + cron refresh payment status
-    # -------------------------------------------------------------------------
-    def action_refresh_last_mollie_payment_status(self):
-        """Fetch last payment status from Mollie and apply accounting when paid."""
-        mollie_provider = self.env["payment.provider"].search([("code", "=", "mollie")], limit=1)
-        api_key = getattr(mollie_provider, "mollie_api_key", False)
-        if not api_key:
-            return
+        # Invoice charged by that payment, linked when the renewal was invoiced
+        invoice = self.env["account.move"].sudo().search([("mollie_payment_id", "=", payment_id)], limit=1)
 
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
+        # 1) Primary match: last_payment_id
+        order = self.sudo().search([("last_payment_id", "=", payment_id)], limit=1)
 
-        for order in self:
-            payment_id = order.last_payment_id
-            if not payment_id:
-                continue
+        # 2) Order of the linked invoice (older renewal)
+        if not order:
+            order = invoice.line_ids.sale_line_ids.order_id[:1]
 
+        # 3) Fallback match: Mollie metadata order_id
+        if not order and meta_order_id:
             try:
-                resp = order._mollie_api_request(
-                    method="GET",
-                    url=f"https://api.mollie.com/v2/payments/{payment_id}",
-                    headers=headers,
-                    timeout=15,
-                    max_retries=3,
-                )
-                if not resp or resp.status_code != 200:
-                    text = resp.text if resp else "No response"
-                    order.message_post(body=f"⚠️ Mollie status fetch failed for {payment_id}: {text}")
-                    continue
+                order = self.sudo().browse(int(meta_order_id)).exists()
+            except (TypeError, ValueError):
+                order = self.browse()
+
+        if not order:
+            _logger.warning("No order found for Mollie payment ID %s", payment_id)
+            return order
+
+        _logger.info("Processing subscription webhook for order %s and payment %s", order.name, payment_id)
+
+        # If the order.last_payment_id is not set (rare case), set it so refresh works
+        if not order.last_payment_id:
+            order.write({"last_payment_id": payment_id})
+
+        if order.last_payment_id == payment_id:
+            # Payload was just fetched from Mollie: apply it without a second GET
+            order._mollie_apply_payment_data(payment_data)
+        elif invoice:
+            # Webhook for an older renewal (or a late retry of one): settle the invoice that payment charged
+            seen = self.env["mollie.payment.event"].sudo().search_count(
+                [("payment_id", "=", payment_id), ("status", "=", status)], limit=1
+            )
+            order._mollie_payment_event_vals(
+                payment_id, status,
+                amount=float((payment_data.get("amount") or {}).get("value") or 0.0),
+                method=payment_data.get("method"),
+            )
+            if status == "failed" and not seen:
+                # First time this failure is seen: queue the retry of the charge
+                self.env["mollie.charge.retry"].sudo()._schedule_for_failed_payment(payment_id, payment_data)
+            self.env["account.move"]._mollie_queue_invoice_status({payment_id: status})
+            if status == "paid":
+                amount = (payment_data.get("amount") or {}).get("value") or 0.0
+                self._process_mollie_payments_success_batch([(order, payment_id, float(amount))])
+        else:
+            # Older renewal without a linked invoice: refresh the order's current payment instead
+            order.action_refresh_last_mollie_payment_status()
+        return order
+
+    def _mollie_refresh_payment_status_bulk(self):
+        """
+        Refresh many orders with Mollie's paginated payments list instead of one GET per order.
 
-                data = resp.json() if resp.content else {}
-                status = data.get("status")
-                paid = True if status == "paid" else False
-                now = fields.Datetime.now()
+        Pages are walked newest first until they leave the refresh window (or every wanted
+        payment was seen). Orders whose payment was not found in the window fall back to
+        the per-payment GET of _mollie_refresh_payment_status().
+        Each Mollie account (lane) has its own payments list; the lanes are walked in
+        parallel and their pages applied in this thread.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        try:
+            window_days = int(ICP.get_param("mollie_recurring_payments.bulk_refresh_window_days", 7))
+        except (TypeError, ValueError):
+            window_days = 7
+        window_start = fields.Datetime.now() - timedelta(days=window_days)
+        workers, rate = self.env["payment.provider"]._mollie_recurring_dispatch_settings()
+
+        lanes = []
+        for provider, lane_orders in self._mollie_group_by_provider():
+            client = provider._mollie_recurring_client() if provider else None
+            if client:
+                lanes.append((client, lane_orders))
+        if not lanes:
+            return
 
-                amount_value = 0.0
-                try:
-                    amount_value = float((data.get("amount") or {}).get("value") or 0.0)
-                except Exception:
-                    amount_value = 0.0
+        # One job per lane: the pages of a Mollie account are walked by one worker thread
+        dispatcher = MollieDispatcher(
+            send=lambda job: _mollie_list_recent_payments(job[0], job[1], window_start),
+            max_workers=min(workers, len(lanes)),
+            rate=rate,
+        )
+        jobs = [(client, set(lane_orders.filtered("last_payment_id").mapped("last_payment_id"))) for client, lane_orders in lanes]
+        fallback = self.browse()
+        for (client, lane_orders), result in zip(lanes, dispatcher.start(jobs)):
+            if result.skipped or result.error:
+                _logger.warning("⚠️ Mollie payments list failed (%s), falling back to per-payment refresh", result.error)
+                fallback |= lane_orders
+                continue
+            fallback |= lane_orders._mollie_apply_payments_list(*result.response)
+        fallback._mollie_refresh_payment_status(priority=PRIORITY_BACKGROUND)
 
-                paid_at = False
-                paid_at_str = data.get("paidAt") or data.get("authorizedAt") or data.get("createdAt")
-                if paid_at_str:
-                    try:
-                        paid_at = date_parser.isoparse(paid_at_str).replace(tzinfo=None)
-                    except Exception:
-                        paid_at = False
-
-                vals = {
-                    "mollie_last_payment_status": status,
-                    "mollie_last_payment_paid": paid,
-                    "mollie_last_payment_amount": amount_value,
-                    "mollie_last_payment_paid_at": paid_at,
-                    "mollie_last_payment_checked_at": now,
-                }
-
-                if paid:
-                    vals["mollie_last_payment_unpaid_since"] = False
-                    order._process_mollie_payment_success(payment_id, amount_value)
-                else:
-                    if not order.mollie_last_payment_unpaid_since:
-                        vals["mollie_last_payment_unpaid_since"] = now
-
-                order.sudo().write(vals)
-
-            except Exception as e:
-                _logger.exception("⚠️ Mollie status exception for order %s", order.name)
-                order.message_post(body=f"⚠️ Mollie status exception: {e}")
+    def _mollie_apply_payments_list(self, payments, pages, rate_limited):
+        """
+        Apply a Mollie payments list (see _mollie_list_recent_payments()) to these orders of
+        one lane. Return the orders left for the per-payment refresh.
+        """
+        PaymentCache = self.env["mollie.payment.cache"].sudo()
+        PaymentCache._store_payments(payments)
+        orders_by_payment = {order.last_payment_id: order for order in self if order.last_payment_id}
+        refreshed = self.env["sale.order"]
+        paid_entries = []
+        for data in payments:
+            order = orders_by_payment.pop(data.get("id"), None)
+            if order and order._mollie_apply_refreshed_payment(data, paid_entries):
+                refreshed |= order
+
+        # Payments matched before a rate limit stop are registered all the same
+        self._process_mollie_payments_success_batch(paid_entries)
+
+        if rate_limited:
+            # The unmatched orders keep their schedule and are picked up by the next run
+            return self.browse()
+        _logger.info(
+            "🔄 Mollie bulk refresh: %d order(s) matched over %d page(s), %d left for per-payment refresh",
+            len(refreshed),
+            pages,
+            len(self) - len(refreshed),
+        )
+        return self - refreshed
 
     def _process_mollie_payment_success(self, payment_id, amount_value):
         """
@@ -460,81 +743,167 @@ class SaleOrder(models.Model):
         -> invoice.payment_state becomes paid automatically
         """
         self.ensure_one()
-        _logger.info("✅ Processing Mollie payment success payment_id=%s order=%s", payment_id, self.name)
+        results = self._process_mollie_payments_success_batch([(self, payment_id, amount_value)])
+        return results.get(payment_id, True)
 
-        existing_payment = self.env["account.payment"].sudo().search([
-            ("mollie_payment_id", "=", payment_id),
+    @api.model
+    def _process_mollie_payments_success_batch(self, entries):
+        """
+        Batch variant of _process_mollie_payment_success().
+
+        :param entries: iterable of ``(order, payment_id, amount_value)``
+        :return: dict ``{payment_id: success}``
+
+        Already processed payment ids are found with one query, the journal and payment
+        method line are resolved once, payments are created with one multi-create,
+        posted together and reconciled with their invoices in one reconciliation plan.
+        """
+        entries = [(order, payment_id, amount_value) for order, payment_id, amount_value in entries if payment_id]
+        results = {}
+        if not entries:
+            return results
+
+        for order, payment_id, _amount in entries:
+            _logger.info("✅ Processing Mollie payment success payment_id=%s order=%s", payment_id, order.name)
+
+        existing_payment_ids = set(self.env["account.payment"].sudo().search([
+            ("mollie_payment_id", "in", [payment_id for _order, payment_id, _amount in entries]),
             ("state", "in", ("posted", "reconciled")),
-        ], limit=1)
-        if existing_payment:
-            _logger.info("⏭️ Mollie payment %s already processed in Odoo (%s).", payment_id, existing_payment.name)
-            return True
+        ]).mapped("mollie_payment_id"))
+
+        # Invoices linked to their payment when the renewal was invoiced: no guessing needed
+        linked_invoices = {
+            invoice.mollie_payment_id: invoice
+            for invoice in self.env["account.move"].sudo().search([
+                ("mollie_payment_id", "in", [payment_id for _order, payment_id, _amount in entries]),
+            ])
+        }
 
-        invoices = self.invoice_ids.filtered(lambda inv: inv.state == "posted" and inv.payment_state != "paid")
-        if not invoices:
-            _logger.info("⏭️ No posted unpaid invoices for order %s", self.name)
-            return True
+        # Fallback for payments without a linked invoice (charged before the link existed)
+        orders = self.env["sale.order"].concat(*[
+            order for order, payment_id, _amount in entries if payment_id not in linked_invoices
+        ])
+        unpaid_invoice_ids = set(orders.invoice_ids.filtered(
+            lambda inv: inv.state == "posted" and inv.payment_state != "paid"
+        ).ids)
+
+        todo = []
+        used_invoice_ids = set()
+        for order, payment_id, amount_value in entries:
+            if payment_id in results:
+                continue
+            if payment_id in existing_payment_ids:
+                _logger.info("⏭️ Mollie payment %s already processed in Odoo.", payment_id)
+                results[payment_id] = True
+                continue
 
-        invoice = invoices.sorted("id", reverse=True)[:1]
-        if not invoice:
-            return True
-        invoice = invoice[0]
+            invoice = linked_invoices.get(payment_id)
+            if invoice:
+                if invoice.state != "posted" or invoice.payment_state == "paid":
+                    _logger.info("⏭️ Invoice %s of Mollie payment %s is not open", invoice.name, payment_id)
+                    results[payment_id] = True
+                    continue
+                results[payment_id] = False
+                todo.append((order, payment_id, amount_value, invoice))
+                continue
 
-        if invoice.payment_state == "paid":
-            return True
+            # Latest posted unpaid invoice of the order, not already claimed in this batch
+            invoice_ids = [
+                inv_id for inv_id in order.invoice_ids.ids
+                if inv_id in unpaid_invoice_ids and inv_id not in used_invoice_ids
+            ]
+            if not invoice_ids:
+                _logger.info("⏭️ No posted unpaid invoices for order %s", order.name)
+                results[payment_id] = True
+                continue
+
+            invoice = self.env["account.move"].browse(max(invoice_ids))
+            used_invoice_ids.add(invoice.id)
+            results[payment_id] = False
+            todo.append((order, payment_id, amount_value, invoice))
+
+        if not todo:
+            return results
 
         journal = self.env["account.journal"].search([("type", "=", "bank")], limit=1)
         if not journal:
-            _logger.error("❌ No bank journal found to register payment for order %s", self.name)
-            return False
+            _logger.error("❌ No bank journal found to register %d Mollie payment(s)", len(todo))
+            return results
 
         payment_method_line = journal.inbound_payment_method_line_ids[:1]
         if not payment_method_line:
             _logger.error("❌ No inbound payment method line on journal %s", journal.display_name)
-            return False
-
-        pay_amount = invoice.amount_residual
-        if amount_value and amount_value > 0:
-            pay_amount = invoice.amount_residual or amount_value
+            return results
 
         try:
-            payment_vals = {
-                "date": fields.Date.context_today(self),
+            with self.env.cr.savepoint():
+                self._mollie_register_payments(todo, journal, payment_method_line)
+            results.update({item[1]: True for item in todo})
+        except Exception:
+            # Isolate the failing entries: register the batch again one payment at a time
+            _logger.exception("❌ Batch registration of %d Mollie payment(s) failed, retrying one by one", len(todo))
+            for item in todo:
+                order, payment_id = item[0], item[1]
+                try:
+                    with self.env.cr.savepoint():
+                        self._mollie_register_payments([item], journal, payment_method_line)
+                    results[payment_id] = True
+                except Exception as e:
+                    _logger.exception("❌ Failed to register Mollie payment for order %s: %s", order.name, str(e))
+
+        return results
+
+    @api.model
+    def _mollie_register_payments(self, todo, journal, payment_method_line):
+        """Create, post and reconcile one account.payment per ``(order, payment_id, amount, invoice)``."""
+        today = fields.Date.context_today(self)
+        vals_list = []
+        for order, payment_id, amount_value, invoice in todo:
+            pay_amount = invoice.amount_residual
+            if amount_value and amount_value > 0:
+                pay_amount = invoice.amount_residual or amount_value
+
+            vals_list.append({
+                "date": today,
                 "amount": pay_amount,
                 "payment_type": "inbound",
                 "partner_type": "customer",
-                "partner_id": self.partner_id.id,
+                "partner_id": order.partner_id.id,
                 "journal_id": journal.id,
                 "currency_id": invoice.currency_id.id,
                 "payment_method_line_id": payment_method_line.id,
                 "ref": f"Mollie Subscription Payment {payment_id}",
                 "mollie_payment_id": payment_id,
-            }
+            })
 
-            payment = self.env["account.payment"].sudo().create(payment_vals)
-            payment.action_post()
+        payments = self.env["account.payment"].sudo().create(vals_list)
+        payments.action_post()
 
-            inv_recv_lines = invoice.line_ids.filtered(
-                lambda l: l.account_id.account_type == "asset_receivable" and not l.reconciled
-            )
-            pay_recv_lines = payment.move_id.line_ids.filtered(
+        def receivable_lines(move):
+            return move.line_ids.filtered(
                 lambda l: l.account_id.account_type == "asset_receivable" and not l.reconciled
             )
 
-            lines_to_reconcile = inv_recv_lines | pay_recv_lines
+        reconcile_plan = []
+        for payment, (_order, _payment_id, _amount, invoice) in zip(payments, todo):
+            lines_to_reconcile = receivable_lines(invoice) | receivable_lines(payment.move_id)
             if lines_to_reconcile:
-                lines_to_reconcile.reconcile()
+                reconcile_plan.append(lines_to_reconcile)
+        if reconcile_plan:
+            self.env["account.move.line"]._reconcile_plan(reconcile_plan)
 
-            _logger.info("✅ Payment %s posted and reconciled with invoice %s", payment.name, invoice.name)
-            return True
-
-        except Exception as e:
-            _logger.exception("❌ Failed to register Mollie payment for order %s: %s", self.name, str(e))
-            return False
+        _logger.info("✅ %d Mollie payment(s) posted and reconciled", len(payments))
+        return payments
 
     @api.model
     def cron_refresh_mollie_last_payment_status(self):
         orders = self.search(self._mollie_subscription_status_refresh_domain())
-        if orders:
-            orders.action_refresh_last_mollie_payment_status()
+        if not orders:
+            return True
+
+        bulk = self.env["ir.config_parameter"].sudo().get_param("mollie_recurring_payments.bulk_refresh", "1")
+        if str(bulk).lower() in ("1", "true", "yes"):
+            orders._mollie_refresh_payment_status_bulk()
+        else:
+            orders._mollie_refresh_payment_status(priority=PRIORITY_BACKGROUND)
         return True
\ No newline at end of file
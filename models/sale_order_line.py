@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+from .mollie_renewal_summary import MOLLIE_SUMMARY_LINE_FIELDS
+
+
+class SaleOrderLine(models.Model):
+    _inherit = "sale.order.line"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        lines._mollie_queue_customer_provisioning()
+        lines.order_id._mollie_mark_summary_dirty()
+        return lines
+
+    def write(self, vals):
+        res = super().write(vals)
+        if MOLLIE_SUMMARY_LINE_FIELDS.intersection(vals):
+            self.order_id._mollie_mark_summary_dirty()
+        return res
+
+    def unlink(self):
+        orders = self.order_id
+        res = super().unlink()
+        orders.exists()._mollie_mark_summary_dirty()
+        return res
+
+    def _mollie_queue_customer_provisioning(self):
+        """
+        Create the Mollie customer in the background as soon as a partner puts a
+        subscription product in an order, so checkout does not have to.
+        """
+        partners = self.filtered(lambda line: line.product_id.recurring_invoice).order_id.partner_id
+        partners = partners.filtered(
+            lambda p: not p.mollie_customer_id and not p.mollie_customer_provision_due and not p._mollie_is_public()
+        )
+        if partners:
+            partners._mollie_schedule_customer_provisioning()
@@ -1 +1,2 @@
 from . import test_mollie_subscription
+from . import test_mollie_benchmark
\ No newline at end of file
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the Mollie API, used by the benchmark suite.
+
+Implements the endpoints this module calls (payments create / get / list,
+customers create, customer mandates / payments list) with configurable latency, 429
+responses carrying ``Retry-After`` and injected 5xx errors. Every request is
+counted per endpoint.
+"""
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeMollieServer:
+    """
+    :param latency: seconds added to every response
+    :param rate_limit_every: answer every Nth request with 429 (0 = never)
+    :param retry_after: ``Retry-After`` seconds sent with the 429 responses
+    :param error_every: answer every Nth request with 503 (0 = never)
+    """
+
+    def __init__(self, latency=0.0, rate_limit_every=0, retry_after=1, error_every=0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.error_every = error_every
+
+        self.calls = Counter()
+        self.payments = {}
+        self.customers = {}
+        self._payment_ids = []
+        self._idempotency_keys = {}
+        self._lock = threading.Lock()
+        self._request_seq = itertools.count(1)
+        self._id_seq = itertools.count(1)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-mollie", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+
+    # ------------------------------------------------------------------
+    # Fake API
+    # ------------------------------------------------------------------
+    def _new_id(self, prefix):
+        return f"{prefix}_{next(self._id_seq):010d}"
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+    def _create_payment(self, body, idempotency_key=None):
+        # Same Idempotency-Key: Mollie replays the original payment instead of creating one
+        if idempotency_key and idempotency_key in self._idempotency_keys:
+            return 201, self.payments[self._idempotency_keys[idempotency_key]]
+        payment = {
+            "resource": "payment",
+            "id": self._new_id("tr"),
+            "status": "open",
+            "amount": body.get("amount") or {"currency": "EUR", "value": "0.00"},
+            "description": body.get("description"),
+            "method": "directdebit",
+            "sequenceType": body.get("sequenceType"),
+            "customerId": body.get("customerId"),
+            "mandateId": body.get("mandateId"),
+            "metadata": body.get("metadata"),
+            "createdAt": self._now(),
+        }
+        with self._lock:
+            self.payments[payment["id"]] = payment
+            self._payment_ids.append(payment["id"])
+            if idempotency_key:
+                self._idempotency_keys[idempotency_key] = payment["id"]
+        return 201, payment
+
+    def _get_payment(self, payment_id):
+        payment = self.payments.get(payment_id)
+        if not payment:
+            return 404, {"status": 404, "title": "Not Found", "detail": "No payment exists with token."}
+        # Payments settle on their first status check
+        if payment["status"] == "open":
+            payment.update(status="paid", paidAt=self._now())
+        return 200, payment
+
+    def _list_payments(self, query):
+        limit = int((query.get("limit") or ["250"])[0])
+        start_id = (query.get("from") or [None])[0]
+        with self._lock:
+            ids = list(reversed(self._payment_ids))
+        start = ids.index(start_id) if start_id in ids else 0
+        page = ids[start:start + limit]
+        links = {}
+        if start + limit < len(ids):
+            links["next"] = {"href": f"{self.base_url}/v2/payments?from={ids[start + limit]}&limit={limit}"}
+        return 200, {
+            "count": len(page),
+            "_embedded": {"payments": [self.payments[payment_id] for payment_id in page]},
+            "_links": links,
+        }
+
+    def _create_customer(self, body):
+        customer = {"resource": "customer", "id": self._new_id("cst"), "name": body.get("name"), "email": body.get("email")}
+        self.customers[customer["id"]] = customer
+        return 201, customer
+
+    def _list_customer_payments(self, customer_id, query):
+        limit = int((query.get("limit") or ["50"])[0])
+        with self._lock:
+            ids = list(reversed(self._payment_ids))
+        page = [self.payments[payment_id] for payment_id in ids if self.payments[payment_id].get("customerId") == customer_id]
+        return 200, {"count": len(page[:limit]), "_embedded": {"payments": page[:limit]}, "_links": {}}
+
+    def _list_mandates(self, customer_id):
+        mandate = {
+            "resource": "mandate",
+            "id": f"mdt_{customer_id.split('_')[-1]}",
+            "status": "valid",
+            "method": "directdebit",
+            "createdAt": self._now(),
+        }
+        return 200, {"count": 1, "_embedded": {"mandates": [mandate]}, "_links": {}}
+
+    def _route(self, method, path, query, body, idempotency_key=None):
+        if method == "POST" and path == "/v2/payments":
+            return "POST /v2/payments", self._create_payment(body, idempotency_key)
+        if method == "GET" and path == "/v2/payments":
+            return "GET /v2/payments", self._list_payments(query)
+        match = re.fullmatch(r"/v2/payments/([\w-]+)", path)
+        if method == "GET" and match:
+            return "GET /v2/payments/{id}", self._get_payment(match.group(1))
+        if method == "POST" and path == "/v2/customers":
+            return "POST /v2/customers", self._create_customer(body)
+        match = re.fullmatch(r"/v2/customers/([\w-]+)/mandates", path)
+        if method == "GET" and match:
+            return "GET /v2/customers/{id}/mandates", self._list_mandates(match.group(1))
+        match = re.fullmatch(r"/v2/customers/([\w-]+)/payments", path)
+        if method == "GET" and match:
+            return "GET /v2/customers/{id}/payments", self._list_customer_payments(match.group(1), query)
+        return f"{method} {path}", (404, {"status": 404, "title": "Not Found"})
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                body = json.loads(raw) if raw else {}
+                url = urlparse(self.path)
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                seq = next(server._request_seq)
+                headers = {}
+                # Rejected requests have no side effect (no payment / customer created)
+                if server.rate_limit_every and seq % server.rate_limit_every == 0:
+                    endpoint, (status, payload) = "429", (429, {"status": 429, "title": "Too Many Requests"})
+                    headers["Retry-After"] = str(server.retry_after)
+                elif server.error_every and seq % server.error_every == 0:
+                    endpoint, (status, payload) = "5xx", (503, {"status": 503, "title": "Service Unavailable"})
+                else:
+                    endpoint, (status, payload) = server._route(
+                        method, url.path, parse_qs(url.query), body, self.headers.get("Idempotency-Key")
+                    )
+
+                with server._lock:
+                    server.calls[endpoint] += 1
+
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/hal+json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,161 @@
+"""
+Volume benchmarks for charging, status refresh and webhook processing.
+
+Runs against a local fake Mollie server (see fake_mollie_server.py) and reports,
+per scenario and volume: wall time, Mollie API calls, SQL queries and peak
+Python memory. Not part of the standard test run:
+
+    odoo-bin -d <db> -i mollie_recurring_payments --test-tags mollie_benchmark
+
+Environment variables:
+
+- MOLLIE_BENCHMARK_SIZES: comma separated subscription counts (default 1000,10000,100000)
+- MOLLIE_BENCHMARK_LATENCY: fake Mollie latency in seconds (default 0.02)
+- MOLLIE_BENCHMARK_429_EVERY: answer every Nth call with 429 (default 200, 0 = never)
+- MOLLIE_BENCHMARK_5XX_EVERY: answer every Nth call with 503 (default 500, 0 = never)
+"""
+import logging
+import os
+import time
+import tracemalloc
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from .fake_mollie_server import FakeMollieServer
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged("-standard", "-at_install", "post_install", "mollie_benchmark")
+class TestMollieBenchmark(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sizes = [
+            int(size) for size in os.environ.get("MOLLIE_BENCHMARK_SIZES", "1000,10000,100000").split(",") if size
+        ]
+        cls.server = FakeMollieServer(
+            latency=float(os.environ.get("MOLLIE_BENCHMARK_LATENCY", 0.02)),
+            rate_limit_every=int(os.environ.get("MOLLIE_BENCHMARK_429_EVERY", 200)),
+            retry_after=1,
+            error_every=int(os.environ.get("MOLLIE_BENCHMARK_5XX_EVERY", 500)),
+        ).start()
+        cls.addClassCleanup(cls.server.stop)
+
+        ICP = cls.env["ir.config_parameter"].sudo()
+        ICP.set_param("mollie_recurring_payments.api_base_url", cls.server.base_url)
+        ICP.set_param("mollie_recurring_payments.rate_limit", 500)
+        ICP.set_param("mollie_recurring_payments.charge_workers", 16)
+        # One charge run per measurement, not one slot of it
+        ICP.set_param("mollie_recurring_payments.charge_slot_minutes", 0)
+
+        cls.provider = cls.env.ref("payment.payment_provider_mollie")
+        cls.provider.write({
+            "mollie_api_key": "test_benchmark",
+            "state": "test",
+            "company_id": cls.env.company.id,
+        })
+        cls.plan = cls.env["sale.subscription.plan"].create({
+            "name": "Benchmark Monthly",
+            "billing_period_value": 1,
+            "billing_period_unit": "month",
+        })
+        cls.product = cls.env["product.product"].create({
+            "name": "Benchmark Subscription",
+            "type": "service",
+            "list_price": 25.0,
+            "recurring_invoice": True,
+        })
+
+    def _generate_subscriptions(self, size, chunk_size=1000):
+        today = fields.Date.today()
+        orders = self.env["sale.order"]
+        for start in range(0, size, chunk_size):
+            count = min(chunk_size, size - start)
+            partners = self.env["res.partner"].create([{
+                "name": f"Benchmark Customer {start + i}",
+                "email": f"benchmark{start + i}@example.com",
+                "mollie_customer_id": f"cst_bench{start + i}",
+                "mollie_mandate_id": f"mdt_bench{start + i}",
+                "mollie_mandate_status": "valid",
+            } for i in range(count)])
+            chunk = self.env["sale.order"].create([{
+                "partner_id": partner.id,
+                "plan_id": self.plan.id,
+                "order_line": [(0, 0, {"product_id": self.product.id, "product_uom_qty": 1})],
+            } for partner in partners])
+            chunk.action_confirm()
+            chunk.write({"next_invoice_date": today})
+            orders |= chunk
+            self.env.invalidate_all()
+        return orders
+
+    def _measure(self, scenario, size, func):
+        self.env.flush_all()
+        self.server.reset_counters()
+        queries_before = self.env.cr.sql_log_count
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            func()
+            self.env.flush_all()
+        finally:
+            wall_time = time.perf_counter() - started
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        result = {
+            "scenario": scenario,
+            "size": size,
+            "wall_time": wall_time,
+            "api_calls": self.server.total_calls,
+            "api_calls_by_endpoint": dict(self.server.calls),
+            "sql_queries": self.env.cr.sql_log_count - queries_before,
+            "peak_memory_mb": peak / (1024 * 1024),
+        }
+        _logger.info(
+            "MOLLIE BENCHMARK %-8s size=%-7d wall=%8.2fs api_calls=%-7d sql=%-8d peak_mem=%7.1fMB %s",
+            scenario,
+            size,
+            result["wall_time"],
+            result["api_calls"],
+            result["sql_queries"],
+            result["peak_memory_mb"],
+            result["api_calls_by_endpoint"],
+        )
+        return result
+
+    def _run_scenarios(self, size):
+        SaleOrder = self.env["sale.order"]
+        WebhookEvent = self.env["mollie.webhook.event"]
+        orders = self._generate_subscriptions(size)
+
+        self._measure("charge", size, SaleOrder._cron_recurring_create_invoice)
+        charged = orders.filtered("last_payment_id")
+        self.assertTrue(charged, "No subscription was charged")
+
+        # Make every in-flight payment due for a status check
+        charged.write({"mollie_next_status_check_at": fields.Datetime.now() - timedelta(minutes=1)})
+        self._measure("refresh", size, SaleOrder.cron_refresh_mollie_last_payment_status)
+
+        def deliver_webhooks():
+            for order in charged:
+                WebhookEvent._enqueue(order.last_payment_id)
+            while WebhookEvent.search_count([("state", "=", "pending")]):
+                WebhookEvent._cron_drain_inbox()
+
+        self._measure("webhook", size, deliver_webhooks)
+
+    def test_benchmark_volumes(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                savepoint = self.env.cr.savepoint()
+                try:
+                    self._run_scenarios(size)
+                finally:
+                    savepoint.close(rollback=True)
+                    self.env.invalidate_all()
@@ -1,6 +1,15 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.sql_db import db_connect
 from odoo.tests.common import TransactionCase
 from odoo.addons.sale.tests.common import TestSaleCommon
 
+from ..models.sale_order import _mollie_list_recent_payments
+from ..tools.mollie_client import MollieClient, MollieRateLimited, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from ..tools.mollie_rate_limiter import MollieRateLimiter, bucket_key
+from .fake_mollie_server import FakeMollieServer
+
 class TestMollieSubscription(TransactionCase):
 
     def setUp(self):
@@ -56,3 +65,442 @@ class TestMollieSubscription(TransactionCase):
         
         # Verify a payment exists and is linked
         self.assertTrue(self.invoice.payment_ids)
+
+
+    def test_subscription_webhook_payload_applied_without_refetch(self):
+        """A verified webhook payload for the order's last payment is applied directly"""
+        payment_id = 'tr_webhook123'
+        self.sale_order.last_payment_id = payment_id
+
+        order = self.env['sale.order']._mollie_process_subscription_webhook_payment(payment_id, {
+            'id': payment_id,
+            'status': 'paid',
+            'amount': {'currency': 'EUR', 'value': '100.00'},
+            'method': 'directdebit',
+            'metadata': {'order_id': self.sale_order.id},
+        })
+
+        self.assertEqual(order, self.sale_order)
+        self.assertEqual(self.sale_order.mollie_last_payment_status, 'paid')
+        self.assertFalse(self.sale_order.mollie_next_status_check_at)
+        self.assertEqual(self.invoice.payment_state, 'paid')
+
+    def test_process_mollie_payments_success_batch_skips_processed(self):
+        """Batch accounting pays the invoice once, even if the payment id is repeated"""
+        payment_id = 'tr_batch123'
+        results = self.env['sale.order']._process_mollie_payments_success_batch([
+            (self.sale_order, payment_id, 100.0),
+            (self.sale_order, payment_id, 100.0),
+        ])
+
+        self.assertEqual(results, {payment_id: True})
+        self.assertEqual(self.invoice.payment_state, 'paid')
+        self.assertEqual(
+            self.env['account.payment'].search_count([('mollie_payment_id', '=', payment_id)]), 1
+        )
+
+    def test_charge_run_resume_confirms_invoiced_orders(self):
+        """A sent charge whose order was invoiced before an interruption is confirmed, not invoiced again"""
+        run_date = fields.Date.today() - timedelta(days=1)
+        ChargeRun = self.env['mollie.charge.run']
+        key = ChargeRun._charge_key(self.sale_order.id, run_date)
+        self.assertEqual(key, ChargeRun._charge_key(self.sale_order.id, run_date))
+        self.assertNotEqual(key, ChargeRun._charge_key(self.sale_order.id, fields.Date.today()))
+
+        run = ChargeRun.create({'run_date': run_date})
+        line = self.env['mollie.charge.run.line'].create({
+            'run_id': run.id,
+            'order_id': self.sale_order.id,
+            'idempotency_key': key,
+            'state': 'sent',
+            'payment_id': 'tr_run123',
+        })
+        self.sale_order.next_invoice_date = fields.Date.today() + timedelta(days=30)
+        invoices = self.sale_order.invoice_ids
+
+        self.assertTrue(run._process())
+
+        self.assertEqual(line.state, 'confirmed')
+        self.assertEqual(run.state, 'done')
+        self.assertEqual(self.sale_order.invoice_ids, invoices)
+
+    def test_payment_status_propagates_to_linked_invoice_only(self):
+        """A Mollie status change reaches the invoice charged by that payment, not older invoices"""
+        old_invoice = self.sale_order._create_invoices()
+        old_invoice.mollie_last_payment_status = 'paid'
+        payment_id = 'tr_status123'
+        self.invoice.mollie_payment_id = payment_id
+        self.sale_order.last_payment_id = payment_id
+
+        self.sale_order.write({'mollie_last_payment_status': 'failed'})
+        self.env['account.move']._mollie_flush_invoice_status()
+
+        self.assertEqual(self.invoice.mollie_last_payment_status, 'failed')
+        self.assertEqual(old_invoice.mollie_last_payment_status, 'paid')
+
+    def test_mandate_status_change_keeps_order_reference(self):
+        """A mandate status change updates the mollie.mandate row; a new mandate relinks the orders"""
+        self.partner.write({'mollie_customer_id': 'cst_mdt123', 'mollie_mandate_id': 'mdt_first', 'mollie_mandate_status': 'valid'})
+        mandate = self.sale_order.mollie_mandate_ref_id
+        self.assertEqual(mandate.mandate_id, 'mdt_first')
+        self.assertEqual(self.sale_order.mollie_mandate_status, 'valid')
+
+        self.partner.write({'mollie_mandate_status': 'invalid'})
+        self.assertEqual(self.sale_order.mollie_mandate_ref_id, mandate)
+        self.assertEqual(self.sale_order.mollie_mandate_status, 'invalid')
+
+        self.partner.write({'mollie_mandate_id': 'mdt_second', 'mollie_mandate_status': 'valid'})
+        self.assertEqual(self.sale_order.mollie_mandate_id, 'mdt_second')
+        self.assertEqual(mandate.status, 'invalid')
+
+    def test_late_webhook_pays_linked_invoice(self):
+        """A webhook for an older renewal pays the invoice linked to its payment, not the newest one"""
+        self.invoice.mollie_payment_id = 'tr_old123'
+        newer_invoice = self.sale_order._create_invoices()
+        newer_invoice.action_post()
+        self.sale_order.last_payment_id = 'tr_new123'
+
+        order = self.env['sale.order']._mollie_process_subscription_webhook_payment('tr_old123', {
+            'id': 'tr_old123',
+            'status': 'paid',
+            'amount': {'currency': 'EUR', 'value': '100.00'},
+        })
+
+        self.assertEqual(order, self.sale_order)
+        self.assertEqual(self.invoice.payment_state, 'paid')
+        self.assertEqual(newer_invoice.payment_state, 'not_paid')
+
+    def test_payment_events_record_each_transition_once(self):
+        """Each (payment, status) is appended once to the ledger and the order points at the latest"""
+        self.sale_order.last_payment_id = 'tr_ledger123'
+        payload = {'id': 'tr_ledger123', 'amount': {'currency': 'EUR', 'value': '100.00'}, 'method': 'directdebit'}
+
+        self.sale_order._mollie_apply_payment_data(dict(payload, status='open'))
+        self.sale_order._mollie_apply_payment_data(dict(payload, status='open'))
+        self.sale_order._mollie_apply_payment_data(dict(payload, status='failed'))
+
+        events = self.env['mollie.payment.event'].search([('payment_id', '=', 'tr_ledger123')])
+        self.assertEqual(sorted(events.mapped('status')), ['failed', 'open'])
+        self.assertEqual(self.sale_order.mollie_last_payment_event_id.status, 'failed')
+        self.assertEqual(self.sale_order.mollie_last_payment_event_id.method, 'directdebit')
+
+    def test_failed_payment_queues_retry_by_reason(self):
+        """A failed payment queues one retry on its reason's schedule; revoked mandates are dropped"""
+        run = self.env['mollie.charge.run'].create({'run_date': fields.Date.today()})
+        line = self.env['mollie.charge.run.line'].create({
+            'run_id': run.id,
+            'order_id': self.sale_order.id,
+            'idempotency_key': 'odoo-renewal-retry',
+            'state': 'confirmed',
+            'payment_id': 'tr_failed123',
+        })
+        Retry = self.env['mollie.charge.retry']
+
+        retry = Retry._schedule_for_failed_payment('tr_failed123', {'status': 'failed', 'details': {'bankReasonCode': 'AM04'}})
+        self.assertEqual((retry.reason, retry.state, retry.attempt), ('insufficient_funds', 'queued', 1))
+        self.assertGreaterEqual(retry.due_at, fields.Datetime.now() + timedelta(hours=72))
+        self.assertFalse(Retry._schedule_for_failed_payment('tr_failed123', {'status': 'failed'}))
+
+        retry.state = 'failed'
+        dropped = Retry._schedule(line, Retry._classify_failure({'details': {'bankReasonCode': 'MD01'}}))
+        self.assertEqual((dropped.reason, dropped.state), ('mandate_revoked', 'dropped'))
+        self.assertFalse(dropped.due_at)
+
+    def test_charge_slot_quota_spreads_the_day(self):
+        """Pending charges are spread over the slots left in the charge window, capped by the rate budget"""
+        ChargeRun = self.env['mollie.charge.run']
+        morning = fields.Datetime.to_datetime('2024-01-10 08:00:00')
+        self.assertEqual(ChargeRun._get_slot_quota(1000, now=morning), 21)
+        self.assertEqual(ChargeRun._get_slot_quota(10 ** 6, now=morning), 3375)
+        # Past the window: whatever the budget allows
+        self.assertEqual(ChargeRun._get_slot_quota(1000, now=morning.replace(hour=22)), 1000)
+
+        self.env['ir.config_parameter'].sudo().set_param('mollie_recurring_payments.charge_slot_minutes', 0)
+        self.assertIsNone(ChargeRun._get_slot_quota(1000, now=morning))
+
+    def test_bulk_refresh_rate_limited_registers_paid_payments(self):
+        """A bulk refresh stopped by the rate limit still registers the payments matched before"""
+        class Response:
+            status_code = 200
+            content = b'{}'
+            text = '{}'
+
+            def __init__(self, body):
+                self.body = body
+
+            def json(self):
+                return self.body
+
+        class Client:
+            calls = 0
+
+            def get(self, url, params=None, priority=None):
+                Client.calls += 1
+                if Client.calls > 1:
+                    raise MollieRateLimited('Mollie rate budget exhausted', retry_after=60)
+                return Response({
+                    '_embedded': {'payments': [{
+                        'id': 'tr_bulk123',
+                        'status': 'paid',
+                        'amount': {'currency': 'EUR', 'value': '100.00'},
+                        'createdAt': fields.Datetime.now().isoformat(),
+                    }]},
+                    '_links': {'next': {'href': '/v2/payments?from=tr_next'}},
+                })
+
+        other_order = self.sale_order.copy()
+        self.sale_order.last_payment_id = 'tr_bulk123'
+        other_order.last_payment_id = 'tr_bulk456'
+
+        payments, pages, rate_limited = _mollie_list_recent_payments(
+            Client(), {'tr_bulk123', 'tr_bulk456'}, fields.Datetime.now() - timedelta(days=7)
+        )
+        self.assertEqual((len(payments), pages, rate_limited), (1, 1, True))
+        fallback = (self.sale_order | other_order)._mollie_apply_payments_list(payments, pages, rate_limited)
+
+        self.assertEqual(Client.calls, 2)
+        self.assertFalse(fallback)
+        self.assertEqual(self.sale_order.mollie_last_payment_status, 'paid')
+        self.assertEqual(self.invoice.payment_state, 'paid')
+        self.assertFalse(other_order.mollie_last_payment_status)
+
+    def test_failed_customer_provisioning_backs_off(self):
+        """A failed customer creation is retried later, not picked again at the head of every batch"""
+        self.partner._mollie_schedule_customer_provisioning()
+        Partner = self.env['res.partner']
+
+        Partner._cron_provision_mollie_customers()
+        self.assertTrue(self.partner.mollie_customer_provision_due)
+        self.assertEqual(self.partner.mollie_customer_provision_attempts, 1)
+        self.assertGreater(self.partner.mollie_customer_provision_due_at, fields.Datetime.now())
+
+        Partner._cron_provision_mollie_customers()
+        self.assertEqual(self.partner.mollie_customer_provision_attempts, 1)
+
+    def test_recover_in_flight_charges(self):
+        """Charges left in flight are looked up on Mollie; a rate-limited lookup leaves them pending"""
+        server = FakeMollieServer().start()
+        self.addCleanup(server.stop)
+        self.partner.mollie_customer_id = 'cst_recover1'
+        run = self.env['mollie.charge.run'].create({'run_date': fields.Date.today()})
+        Line = self.env['mollie.charge.run.line']
+        sent_at = fields.Datetime.now() - timedelta(hours=2)
+        lines = Line.create([{
+            'run_id': run.id,
+            'order_id': order.id,
+            'idempotency_key': key,
+            'attempts': 1,
+            'last_attempt_at': sent_at,
+        } for order, key in ((self.sale_order, 'odoo-renewal-sent'), (self.sale_order.copy(), 'odoo-renewal-lost'))])
+        server._create_payment({
+            'amount': {'currency': 'EUR', 'value': '100.00'},
+            'customerId': 'cst_recover1',
+            'metadata': {'charge_key': 'odoo-renewal-sent'},
+        })
+
+        not_found, paused = lines._recover_in_flight(MollieClient('test_recover', base_url=server.base_url))
+        self.assertFalse(paused)
+        self.assertEqual(lines[0].state, 'sent')
+        self.assertEqual(not_found, lines[1])
+        self.assertEqual(server.calls['GET /v2/customers/{id}/payments'], 2)
+
+        class Client:
+            def get(self, url, params=None, priority=None):
+                raise MollieRateLimited('Mollie rate budget exhausted', retry_after=60)
+
+        self.assertEqual(lines[1]._recover_in_flight(Client()), (Line, True))
+        self.assertEqual(lines[1].state, 'pending')
+
+    def test_refused_charge_classified_by_status(self):
+        """Charges refused with a 429 or a 5xx are retried on the rate limit / server error schedules"""
+        Retry = self.env['mollie.charge.retry']
+        self.assertEqual(Retry._classify_failure({'status': 429}, status_code=429), 'rate_limited')
+        self.assertEqual(Retry._classify_failure({'status': 503}, status_code=503), 'server_error')
+        self.assertEqual(Retry._classify_failure({'field': 'mandateId'}, status_code=422), 'mandate_revoked')
+        self.assertEqual(Retry._classify_failure({'status': 422}, status_code=422), 'other')
+
+    def test_late_retry_keeps_current_payment(self):
+        """A retry of an older period landing after the next renewal does not replace the current payment"""
+        ChargeRun = self.env['mollie.charge.run']
+        Line = self.env['mollie.charge.run.line']
+        today = fields.Date.today()
+        old_line, current_line = Line.create([{
+            'run_id': ChargeRun.create({'run_date': run_date}).id,
+            'order_id': self.sale_order.id,
+            'idempotency_key': key,
+            'state': 'failed',
+            'payment_id': payment_id,
+        } for run_date, key, payment_id in (
+            (today - timedelta(days=31), 'odoo-renewal-old', 'tr_late_old'),
+            (today, 'odoo-renewal-current', 'tr_late_current'),
+        )])
+        current_line.state = 'sent'
+        self.invoice.mollie_payment_id = 'tr_late_old'
+        self.sale_order.last_payment_id = 'tr_late_current'
+
+        old_line._mark_sent({'id': 'tr_late_retry', 'status': 'open', 'amount': {'currency': 'EUR', 'value': '100.00'}})
+
+        self.assertEqual(self.sale_order.last_payment_id, 'tr_late_current')
+        self.assertEqual((old_line.state, old_line.payment_id), ('sent', 'tr_late_retry'))
+        self.assertEqual(self.invoice.mollie_payment_id, 'tr_late_retry')
+        self.assertTrue(self.env['mollie.payment.event'].search_count([('payment_id', '=', 'tr_late_retry')]))
+
+        # Its failure still queues the next retry of the older period
+        self.env['sale.order']._mollie_process_subscription_webhook_payment('tr_late_retry', {
+            'id': 'tr_late_retry',
+            'status': 'failed',
+            'details': {'bankReasonCode': 'AM04'},
+        })
+        retry = self.env['mollie.charge.retry'].search([('line_id', '=', old_line.id)])
+        self.assertEqual((retry.reason, retry.state), ('insufficient_funds', 'queued'))
+        self.assertEqual(self.sale_order.last_payment_id, 'tr_late_current')
+
+    def test_done_charge_run_left_alone(self):
+        """A finished run without new due orders is not processed (nor completed) again by later slots"""
+        ChargeRun = self.env['mollie.charge.run']
+        finished_at = fields.Datetime.now() - timedelta(hours=6)
+        run = ChargeRun.create({'run_date': fields.Date.today() - timedelta(days=1)})
+        run.write({'state': 'done', 'finished_at': finished_at})
+
+        ChargeRun._cron_process_charge_runs()
+        self.assertTrue(run._process())
+
+        self.assertEqual((run.state, run.finished_at), ('done', finished_at))
+
+    def test_missing_mandate_flagged_on_order(self):
+        """A subscription whose first payment went without Mollie customer gets a note and a to-do"""
+        self.sale_order._mollie_flag_missing_mandate()
+
+        self.assertTrue(self.sale_order.activity_ids.filtered(lambda a: 'mandate' in (a.summary or '')))
+        self.assertIn('no mandate was created', self.sale_order.message_ids[0].body)
+
+    def test_renewal_summary_follows_order_amount(self):
+        """Editing the lines of a subscription refreshes its renewal summary amount"""
+        plan = self.env['sale.subscription.plan'].create({
+            'name': 'Monthly',
+            'billing_period_value': 1,
+            'billing_period_unit': 'month',
+        })
+        self.sale_order.write({'plan_id': plan.id, 'next_invoice_date': fields.Date.today() + timedelta(days=10)})
+        Summary = self.env['mollie.renewal.summary']
+        Summary._cron_refresh()
+        # As a commit would: the next transaction queues its own dates
+        self.env.cr.precommit.data.pop('mollie_renewal_summary_queued', None)
+
+        def summary_amount():
+            rows = Summary.search([
+                ('renewal_date', '=', self.sale_order.next_invoice_date),
+                ('company_id', '=', self.sale_order.company_id.id),
+            ])
+            return sum(rows.mapped('amount_total'))
+
+        before = summary_amount()
+        old_total = self.sale_order.amount_total
+        self.sale_order.order_line[0].price_unit = 150.0
+        self.assertNotEqual(self.sale_order.amount_total, old_total)
+
+        Summary._cron_refresh()
+
+        self.assertAlmostEqual(summary_amount(), before + self.sale_order.amount_total - old_total)
+
+    def test_status_refresh_domain_and_backoff(self):
+        """Only in-flight payments whose check is due are refreshed; checks back off per payment method"""
+        plan = self.env['sale.subscription.plan'].create({
+            'name': 'Monthly',
+            'billing_period_value': 1,
+            'billing_period_unit': 'month',
+        })
+        now = fields.Datetime.now()
+        self.sale_order.write({
+            'plan_id': plan.id,
+            'last_payment_id': 'tr_refresh123',
+            'mollie_last_payment_status': 'open',
+            'mollie_next_status_check_at': now + timedelta(hours=1),
+        })
+        SaleOrder = self.env['sale.order']
+
+        def due():
+            return self.sale_order in SaleOrder.search(SaleOrder._mollie_subscription_status_refresh_domain())
+
+        self.assertFalse(due())
+        self.sale_order.mollie_next_status_check_at = now - timedelta(minutes=1)
+        self.assertTrue(due())
+        self.sale_order.mollie_last_payment_status = 'paid'
+        self.assertFalse(due())
+
+        self.assertEqual(SaleOrder._mollie_next_status_check_at('ideal', now=now), now + timedelta(seconds=60))
+        self.assertEqual(SaleOrder._mollie_next_status_check_at('ideal', check_count=3, now=now), now + timedelta(seconds=480))
+        self.assertEqual(SaleOrder._mollie_next_status_check_at('ideal', check_count=10, now=now), now + timedelta(hours=1))
+        self.assertEqual(SaleOrder._mollie_next_status_check_at('directdebit', now=now), now + timedelta(hours=6))
+        self.assertEqual(SaleOrder._mollie_next_status_check_at(None, now=now), now + timedelta(seconds=900))
+
+    def test_charge_screening_skips_blocked_orders_and_invalid_mandates(self):
+        """Blocked subscriptions and orders without a valid mandate are skipped before any charge"""
+        SaleOrder = self.env['sale.order']
+        self.assertIs(SaleOrder._mollie_charge_eligibility_spec(), SaleOrder._mollie_charge_eligibility_spec())
+
+        today = fields.Date.today()
+        self.partner.write({'mollie_customer_id': 'cst_screen1', 'mollie_mandate_id': 'mdt_screen1', 'mollie_mandate_status': 'invalid'})
+        self.sale_order.next_invoice_date = today
+        cancelled_order = self.sale_order.copy()
+        cancelled_order.write({'state': 'cancel', 'next_invoice_date': today})
+        self.assertEqual((self.sale_order | cancelled_order)._mollie_screen_blocked_orders(), cancelled_order)
+
+        run = self.env['mollie.charge.run'].create({'run_date': today})
+        lines = self.env['mollie.charge.run.line'].create([{
+            'run_id': run.id,
+            'order_id': order.id,
+            'idempotency_key': f'odoo-renewal-screen-{order.id}',
+        } for order in (self.sale_order, cancelled_order)])
+
+        self.assertFalse(lines._skip_ineligible())
+        self.assertEqual(lines.mapped('state'), ['skipped', 'skipped'])
+        self.assertEqual(lines[0].error, 'No valid Mollie mandate')
+        self.assertEqual(lines[1].error, 'Subscription churned / paused / closed')
+
+    def test_confirm_defers_mandate_sync_with_backoff(self):
+        """Confirming a subscription queues the mandate sync; the sync cron backs off until it gives up"""
+        self.assertTrue(self.partner.mollie_mandate_sync_due_at)
+        self.assertEqual(self.partner.mollie_mandate_sync_attempts, 0)
+        Partner = self.env['res.partner']
+
+        # No Mollie customer yet: no mandate to find, the next attempt waits a minute
+        self.partner.mollie_mandate_sync_due_at = fields.Datetime.now() - timedelta(seconds=1)
+        Partner._cron_sync_pending_mollie_mandates()
+        self.assertEqual(self.partner.mollie_mandate_sync_attempts, 1)
+        self.assertGreaterEqual(self.partner.mollie_mandate_sync_due_at, fields.Datetime.now() + timedelta(seconds=50))
+
+        Partner._cron_sync_pending_mollie_mandates()
+        self.assertEqual(self.partner.mollie_mandate_sync_attempts, 1)
+
+        self.partner.write({'mollie_mandate_sync_attempts': 9, 'mollie_mandate_sync_due_at': fields.Datetime.now()})
+        Partner._cron_sync_pending_mollie_mandates()
+        self.assertEqual(self.partner.mollie_mandate_sync_attempts, 10)
+        self.assertFalse(self.partner.mollie_mandate_sync_due_at)
+
+    def test_rate_limiter_keeps_interactive_reserve(self):
+        """Background calls cannot use the interactive reserve of the shared bucket and fail fast when empty"""
+        key = bucket_key(f'test_reserve_{self.env.cr.dbname}', 'http://mollie.test')
+        limiter = MollieRateLimiter(self.env.cr.dbname, key)
+
+        def cleanup():
+            with db_connect(self.env.cr.dbname).cursor() as cr:
+                cr.execute("DELETE FROM mollie_rate_limit WHERE key = %s", (key,))
+        self.addCleanup(cleanup)
+
+        # 4 tokens, half of them reserved, refilling far too slowly to matter here
+        limiter.configure(0.01, capacity=4, reserve=0.5)
+        client = MollieClient('test_reserve', base_url='http://mollie.test')
+        client.limiter = limiter
+
+        self.assertFalse(limiter.try_acquire(PRIORITY_BACKGROUND))
+        self.assertFalse(limiter.try_acquire(PRIORITY_BACKGROUND))
+        self.assertGreater(limiter.try_acquire(PRIORITY_BACKGROUND), 0)
+        self.assertFalse(client.has_budget(PRIORITY_BACKGROUND))
+        self.assertTrue(client.has_budget(PRIORITY_INTERACTIVE))
+        with self.assertRaises(MollieRateLimited):
+            client._acquire(PRIORITY_BACKGROUND, 'GET /v2/payments/{id}')
+
+        self.assertFalse(limiter.try_acquire(PRIORITY_INTERACTIVE))
+        self.assertFalse(limiter.try_acquire(PRIORITY_INTERACTIVE))
+        self.assertFalse(client.has_budget(PRIORITY_INTERACTIVE))
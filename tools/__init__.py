@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+from . import mollie_client
+from . import mollie_dispatcher
+from . import mollie_metrics
+from . import mollie_rate_limiter
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Pooled HTTP client for the Mollie API.
+
+One client (and thus one keep-alive connection pool) is kept per API key in
+each Odoo worker process, so TLS setup is paid once per worker instead of once
+per request. Clients are thread-safe and can be shared with the dispatcher's
+worker threads.
+"""
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .mollie_metrics import endpoint_label, metrics
+
+_logger = logging.getLogger(__name__)
+
+MOLLIE_API_BASE_URL = "https://api.mollie.com"
+
+# (connect, read) timeouts in seconds, used when the caller does not pass one
+DEFAULT_TIMEOUT = (5, 15)
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_POOL_SIZE = 16
+
+# Methods that can safely be retried after a 5xx response
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "DELETE")
+
+# Interactive calls (webhook verification, checkout) may use the whole shared rate
+# budget; background (cron) calls leave a reserved share of it to them.
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+# Longest wait for the shared rate limiter before giving up with MollieRateLimited
+RATE_LIMIT_MAX_WAIT = {PRIORITY_INTERACTIVE: 10, PRIORITY_BACKGROUND: 5}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class MollieAPIError(Exception):
+    """Mollie answered with an unexpected status code (or not at all)."""
+
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+
+
+class MollieRateLimited(MollieAPIError):
+    """The shared rate budget of the API key is exhausted: try again after ``retry_after`` seconds."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MollieClient:
+    """
+    Keep-alive session bound to one Mollie API key, with the 429 / retry policy.
+
+    ``limiter`` is the optional shared rate limiter of the key (see
+    :mod:`.mollie_rate_limiter`); without one, each call only backs off on its own.
+    """
+
+    def __init__(self, api_key, base_url=MOLLIE_API_BASE_URL, pool_size=DEFAULT_POOL_SIZE):
+        self.base_url = (base_url or MOLLIE_API_BASE_URL).rstrip("/")
+        self.limiter = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Accept": "application/json",
+        })
+
+    def _url(self, path):
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def has_budget(self, priority=PRIORITY_BACKGROUND):
+        """Whether a call of ``priority`` could be sent right now, without blocking."""
+        return self.limiter is None or self.limiter.available(priority) >= 1
+
+    def _acquire(self, priority, endpoint):
+        wait = self.limiter.acquire(priority, RATE_LIMIT_MAX_WAIT.get(priority, 5))
+        if wait:
+            metrics.observe_rate_limited(endpoint)
+            raise MollieRateLimited(
+                f"Mollie rate budget exhausted for {endpoint}, retry in {wait:.0f}s", retry_after=wait
+            )
+
+    def request(self, method, path, json=None, params=None, headers=None,
+                timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES, priority=PRIORITY_INTERACTIVE):
+        """
+        Call the Mollie API and return the last :class:`requests.Response`.
+
+        - 429: wait ``Retry-After`` (default 60s) and retry, up to ``max_retries`` times.
+          With a shared limiter the pause applies to every worker using the key, and
+          waits longer than the priority allows raise :class:`MollieRateLimited`.
+        - 5xx on idempotent methods, or on requests carrying an ``Idempotency-Key``
+          header (Mollie replays the original answer): retry with a linear backoff
+        - network errors: retry with a linear backoff, re-raise on the last attempt
+        """
+        method = method.upper()
+        url = self._url(path)
+        endpoint = endpoint_label(method, urlsplit(url).path)
+        retry_server_errors = method in IDEMPOTENT_METHODS or bool((headers or {}).get("Idempotency-Key"))
+        last_response = None
+
+        for attempt in range(max_retries + 1):
+            if self.limiter is not None:
+                self._acquire(priority, endpoint)
+            started = time.monotonic()
+            try:
+                response = self.session.request(
+                    method=method,
+                    url=url,
+                    json=json,
+                    params=params,
+                    headers=headers,
+                    timeout=timeout,
+                )
+            except requests.RequestException:
+                metrics.observe_network_error(endpoint)
+                if attempt >= max_retries:
+                    raise
+                wait_seconds = 5 * (attempt + 1)
+                metrics.observe_retry(endpoint, wait_seconds)
+                _logger.warning(
+                    "⚠️ Mollie request exception on %s %s. Retrying in %s seconds.",
+                    method,
+                    url,
+                    wait_seconds,
+                )
+                time.sleep(wait_seconds)
+                continue
+
+            last_response = response
+            metrics.observe_response(endpoint, response.status_code, time.monotonic() - started)
+
+            if response.status_code == 429:
+                retry_after = response.headers.get("Retry-After")
+                try:
+                    wait_seconds = int(retry_after) if retry_after else 60
+                except ValueError:
+                    wait_seconds = 60
+                if self.limiter is not None:
+                    self.limiter.throttle(wait_seconds)
+
+                _logger.warning(
+                    "⚠️ Mollie rate limit hit on %s %s. Attempt %s/%s. Waiting %s seconds.",
+                    method,
+                    url,
+                    attempt + 1,
+                    max_retries + 1,
+                    wait_seconds,
+                )
+            elif response.status_code >= 500 and retry_server_errors:
+                wait_seconds = 5 * (attempt + 1)
+                _logger.warning(
+                    "⚠️ Mollie server error %s on %s %s. Attempt %s/%s. Waiting %s seconds.",
+                    response.status_code,
+                    method,
+                    url,
+                    attempt + 1,
+                    max_retries + 1,
+                    wait_seconds,
+                )
+            else:
+                if self.limiter is not None:
+                    self.limiter.observe_headers(response.headers)
+                return response
+
+            if attempt >= max_retries:
+                return response
+            if self.limiter is not None and response.status_code == 429:
+                # The shared limiter holds every worker back until Retry-After
+                metrics.observe_retry(endpoint, 0)
+                continue
+            metrics.observe_retry(endpoint, wait_seconds)
+            time.sleep(wait_seconds)
+
+        return last_response
+
+    def list_all(self, path, embedded_key, params=None, **kwargs):
+        """
+        Return every item of a paginated Mollie list endpoint, following ``_links.next``.
+        Raises :class:`MollieAPIError` when a page cannot be fetched.
+        """
+        items = []
+        next_url = path
+        params = {"limit": 250, **(params or {})}
+        while next_url:
+            response = self.get(next_url, params=params, **kwargs)
+            if response is None or response.status_code != 200:
+                raise MollieAPIError(response.text if response is not None else "No response", response=response)
+            body = response.json() if response.content else {}
+            items += (body.get("_embedded") or {}).get(embedded_key) or []
+            next_url = ((body.get("_links") or {}).get("next") or {}).get("href")
+            # The next link already carries the pagination parameters
+            params = None
+        return items
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, json=None, **kwargs):
+        return self.request("POST", path, json=json, **kwargs)
+
+
+def get_mollie_client(api_key, base_url=None, dbname=None):
+    """Return the worker-wide client for ``api_key``, creating it on first use."""
+    base_url = (base_url or MOLLIE_API_BASE_URL).rstrip("/")
+    # Key on the pid: a pool inherited through fork() must not be reused by the child.
+    # Key on the database too: each one has its own shared rate limiter.
+    key = (os.getpid(), dbname, api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = MollieClient(api_key, base_url=base_url)
+    return client
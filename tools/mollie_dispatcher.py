@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent, rate-limited dispatch of Mollie API calls.
+
+Worker threads only perform HTTP calls: they never touch the Odoo environment
+or cursor. Every database write stays on the calling (cron) thread, which
+consumes the results in submission order.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .mollie_client import MollieRateLimited
+
+_logger = logging.getLogger(__name__)
+
+DispatchResult = namedtuple("DispatchResult", ["job", "response", "error", "skipped"])
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing ``rate`` calls per second with bursts up to ``capacity``."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = max(float(rate), 0.001)
+        self.capacity = max(float(capacity or self.rate), 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until one token is available, then consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+class MollieDispatcher:
+    """
+    Send jobs through a bounded thread pool, paced by a token bucket.
+
+    :param send: callable ``send(job) -> response`` executed in a worker thread
+    :param should_abort: optional callable ``should_abort(response) -> bool``;
+        once it returns True, jobs that have not been sent yet are skipped.
+        They are skipped as well once the shared rate limiter refuses a call.
+    """
+
+    def __init__(self, send, max_workers=4, rate=10.0, burst=None, should_abort=None):
+        self.send = send
+        self.max_workers = max(int(max_workers), 1)
+        self.bucket = TokenBucket(rate, burst)
+        self.should_abort = should_abort
+        self._abort = threading.Event()
+
+    def _run(self, job):
+        if self._abort.is_set():
+            return DispatchResult(job, None, None, True)
+        self.bucket.acquire()
+        if self._abort.is_set():
+            return DispatchResult(job, None, None, True)
+        try:
+            response = self.send(job)
+        except MollieRateLimited:
+            self._abort.set()
+            return DispatchResult(job, None, None, True)
+        except Exception as e:
+            return DispatchResult(job, None, e, False)
+        if self.should_abort and self.should_abort(response):
+            self._abort.set()
+        return DispatchResult(job, response, None, False)
+
+    def start(self, jobs):
+        """
+        Submit every job right away and return an iterator of :class:`DispatchResult`,
+        in the order of ``jobs``. Several dispatchers (e.g. one per Mollie account)
+        can be started before their results are consumed, so they run in parallel.
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return iter(())
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(jobs)),
+            thread_name_prefix="mollie-dispatch",
+        )
+        futures = [executor.submit(self._run, job) for job in jobs]
+        return self._collect(executor, futures)
+
+    def _collect(self, executor, futures):
+        try:
+            for future in futures:
+                yield future.result()
+        except GeneratorExit:
+            # Consumer stopped early: do not send what is still queued.
+            self._abort.set()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
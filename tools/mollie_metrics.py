@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+In-process metrics of the Mollie call layer.
+
+Every Odoo worker aggregates its own numbers (per-endpoint latency histogram,
+status codes, retries, 429s, time spent in backoff, charge pipeline stage
+durations). They are exposed in Prometheus text format by the
+``/mollie/metrics`` route and summarized in the Mollie menu.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ID_SEGMENT = re.compile(r"/[a-z]{2,5}_[A-Za-z0-9]+")
+
+
+def endpoint_label(method, path):
+    """``GET /v2/payments/tr_WDqYK6vllg`` -> ``GET /v2/payments/{id}``"""
+    return f"{method} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+class MollieMetrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency_buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+            self.latency_sum = defaultdict(float)
+            self.latency_count = defaultdict(int)
+            self.responses = defaultdict(int)
+            self.network_errors = defaultdict(int)
+            self.rate_limited = defaultdict(int)
+            self.retries = defaultdict(int)
+            self.backoff_seconds = defaultdict(float)
+            self.limiter_rejections = defaultdict(int)
+            self.stage_seconds = defaultdict(float)
+            self.stage_items = defaultdict(int)
+            self.stage_runs = defaultdict(int)
+
+    def observe_response(self, endpoint, status_code, seconds):
+        with self._lock:
+            buckets = self.latency_buckets[endpoint]
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[index] += 1
+                    break
+            else:
+                buckets[-1] += 1
+            self.latency_sum[endpoint] += seconds
+            self.latency_count[endpoint] += 1
+            self.responses[(endpoint, str(status_code))] += 1
+            if status_code == 429:
+                self.rate_limited[endpoint] += 1
+
+    def observe_network_error(self, endpoint):
+        # No response, no latency: kept out of the request duration histogram
+        with self._lock:
+            self.network_errors[endpoint] += 1
+
+    def observe_retry(self, endpoint, wait_seconds):
+        with self._lock:
+            self.retries[endpoint] += 1
+            self.backoff_seconds[endpoint] += wait_seconds
+
+    def observe_rate_limited(self, endpoint):
+        with self._lock:
+            self.limiter_rejections[endpoint] += 1
+
+    def observe_stage(self, stage, seconds, items):
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_items[stage] += items
+            self.stage_runs[stage] += 1
+
+    def quantile(self, endpoint, q):
+        """Approximate latency quantile: upper bound of the bucket holding the q-th observation."""
+        with self._lock:
+            buckets = list(self.latency_buckets.get(endpoint) or [])
+            total = self.latency_count.get(endpoint, 0)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(buckets):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else float("inf")
+        return float("inf")
+
+    def summary(self):
+        """One dict per endpoint, for the backend summary."""
+        with self._lock:
+            endpoints = sorted(set(self.latency_count) | set(self.network_errors) | set(self.limiter_rejections))
+            statuses = dict(self.responses)
+            rows = [{
+                "endpoint": endpoint,
+                "requests": self.latency_count.get(endpoint, 0),
+                "avg_latency": (
+                    self.latency_sum[endpoint] / self.latency_count[endpoint]
+                    if self.latency_count.get(endpoint) else 0.0
+                ),
+                "network_errors": self.network_errors.get(endpoint, 0),
+                "rate_limited": self.rate_limited.get(endpoint, 0),
+                "retries": self.retries.get(endpoint, 0),
+                "backoff_seconds": self.backoff_seconds.get(endpoint, 0.0),
+                "limiter_rejections": self.limiter_rejections.get(endpoint, 0),
+                "status_codes": ", ".join(
+                    f"{code}: {count}" for (ep, code), count in sorted(statuses.items()) if ep == endpoint
+                ),
+            } for endpoint in endpoints]
+        for row in rows:
+            row["p50_latency"] = self.quantile(row["endpoint"], 0.5)
+            row["p95_latency"] = self.quantile(row["endpoint"], 0.95)
+        return rows
+
+    def render_prometheus(self):
+        """Metrics of this worker in Prometheus text exposition format."""
+        worker = f'worker="{os.getpid()}"'
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP mollie_request_duration_seconds Mollie API response time per endpoint.",
+                "# TYPE mollie_request_duration_seconds histogram",
+            ]
+            for endpoint, buckets in sorted(self.latency_buckets.items()):
+                labels = f'{worker},endpoint="{endpoint}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    cumulative += count
+                    lines.append(f'mollie_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(
+                    f'mollie_request_duration_seconds_bucket{{{labels},le="+Inf"}} {self.latency_count[endpoint]}'
+                )
+                lines.append(f"mollie_request_duration_seconds_sum{{{labels}}} {self.latency_sum[endpoint]:.6f}")
+                lines.append(f"mollie_request_duration_seconds_count{{{labels}}} {self.latency_count[endpoint]}")
+
+            counters = [
+                ("mollie_responses_total", "Mollie API responses per endpoint and status code.", {
+                    f'{worker},endpoint="{endpoint}",code="{code}"': count
+                    for (endpoint, code), count in self.responses.items()
+                }),
+                ("mollie_rate_limited_total", "429 responses received from Mollie.", self.rate_limited),
+                ("mollie_network_errors_total", "Mollie calls that failed without a response.", self.network_errors),
+                ("mollie_retries_total", "Mollie calls retried after a 429, 5xx or network error.", self.retries),
+                ("mollie_backoff_seconds_total", "Time spent sleeping before Mollie retries.", self.backoff_seconds),
+                ("mollie_limiter_rejections_total", "Mollie calls refused by the shared rate limiter.",
+                 self.limiter_rejections),
+            ]
+            for name, help_text, values in counters:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for key, value in sorted(values.items()):
+                    labels = key if key.startswith("worker=") else f'{worker},endpoint="{key}"'
+                    lines.append(f"{name}{{{labels}}} {value:g}" if isinstance(value, float) else f"{name}{{{labels}}} {value}")
+
+            stage_counters = [
+                ("mollie_charge_stage_seconds_total", "Time spent per charge pipeline stage.", self.stage_seconds),
+                ("mollie_charge_stage_items_total", "Items handled per charge pipeline stage.", self.stage_items),
+                ("mollie_charge_stage_runs_total", "Batches run per charge pipeline stage.", self.stage_runs),
+            ]
+            for name, help_text, values in stage_counters:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for stage, value in sorted(values.items()):
+                    lines.append(f'{name}{{{worker},stage="{stage}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+
+# Aggregated per worker process
+metrics = MollieMetrics()
+
+
+@contextmanager
+def timed_stage(stage, items):
+    """Time one batch of a charge pipeline stage handling ``items`` records."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        metrics.observe_stage(stage, seconds, items)
+        _logger.debug("⏱️ Mollie charge stage %s: %d item(s) in %.3fs", stage, items, seconds)
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Cluster-wide, adaptive rate limiting of Mollie API calls.
+
+The token bucket of each Mollie API key lives in the ``mollie_rate_limit``
+table, so every Odoo worker and node draws from the same budget. Each check
+runs on a short-lived cursor of its own that commits right away: it never
+touches the caller's transaction and can be used from the dispatcher's threads.
+
+- a 429 (or rate-limit headers announcing an empty budget) pauses the bucket
+  for every worker until ``Retry-After`` and halves its rate; the rate then
+  recovers linearly up to the configured maximum
+- background (cron) calls cannot use the share of the bucket reserved for
+  interactive calls (webhook verification, checkout)
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from odoo.sql_db import db_connect
+
+from .mollie_client import PRIORITY_BACKGROUND
+
+_logger = logging.getLogger(__name__)
+
+# Seconds for a throttled bucket to climb back from 0 to its maximum rate
+RATE_RECOVERY_SECONDS = 60.0
+# The rate is never cut below this fraction of the configured maximum
+MIN_RATE_RATIO = 0.05
+DEFAULT_RETRY_AFTER = 60
+# After a database error, the limiter is bypassed for this long before trying again
+DISABLED_RETRY_SECONDS = 60
+
+_NOW = "(clock_timestamp() AT TIME ZONE 'UTC')"
+
+
+def bucket_key(api_key, base_url):
+    """Key of the bucket of an API key (the key itself is never stored)."""
+    return hashlib.sha256(f"{base_url}|{api_key}".encode()).hexdigest()[:32]
+
+
+def _header_number(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value not in (None, ""):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+class MollieRateLimiter:
+    """Shared token bucket of one Mollie API key, stored in Postgres."""
+
+    def __init__(self, dbname, key):
+        self.dbname = dbname
+        self.key = key
+        self._config = None
+        self._disabled_until = 0.0
+        self._lock = threading.Lock()
+
+    def _cursor(self):
+        return db_connect(self.dbname).cursor()
+
+    def _guard(self, func, default):
+        """Run ``func(cr)`` on a fresh cursor; never let the limiter break a Mollie call."""
+        if time.monotonic() < self._disabled_until:
+            return default
+        try:
+            with self._cursor() as cr:
+                return func(cr)
+        except Exception:
+            # e.g. table not created yet while the module is being installed
+            _logger.warning("⚠️ Shared Mollie rate limiter unavailable, calls are not limited", exc_info=True)
+            self._disabled_until = time.monotonic() + DISABLED_RETRY_SECONDS
+            return default
+
+    def configure(self, rate, capacity=None, reserve=0.25):
+        """Create or update the bucket: ``rate`` calls per second, bursts up to ``capacity``."""
+        config = (float(rate), float(capacity or rate), float(reserve))
+        if config == self._config:
+            return
+        with self._lock:
+            self._disabled_until = 0.0
+            self._guard(lambda cr: cr.execute(
+                f"""
+                INSERT INTO mollie_rate_limit (key, tokens, rate, max_rate, capacity, reserve, updated_at)
+                VALUES (%(key)s, %(capacity)s, %(rate)s, %(rate)s, %(capacity)s, %(reserve)s, {_NOW})
+                ON CONFLICT (key) DO UPDATE SET
+                    max_rate = EXCLUDED.max_rate,
+                    rate = LEAST(mollie_rate_limit.rate, EXCLUDED.max_rate),
+                    capacity = EXCLUDED.capacity,
+                    tokens = LEAST(mollie_rate_limit.tokens, EXCLUDED.capacity),
+                    reserve = EXCLUDED.reserve
+                """,
+                {"key": self.key, "rate": config[0], "capacity": config[1], "reserve": config[2]},
+            ), None)
+            self._config = config
+
+    def _refill(self, cr, lock=True):
+        """Return the refilled bucket state ``(tokens, rate, capacity, reserve, blocked_for)``."""
+        cr.execute(
+            f"""
+            SELECT tokens, rate, max_rate, capacity, reserve,
+                   -- no refill while paused: count from the end of the pause
+                   GREATEST(EXTRACT(EPOCH FROM {_NOW} - GREATEST(updated_at, COALESCE(blocked_until, updated_at))), 0),
+                   GREATEST(COALESCE(EXTRACT(EPOCH FROM blocked_until - {_NOW}), 0), 0)
+              FROM mollie_rate_limit
+             WHERE key = %s
+            {"FOR UPDATE" if lock else ""}
+            """,
+            (self.key,),
+        )
+        row = cr.fetchone()
+        if not row:
+            return None
+        tokens, rate, max_rate, capacity, reserve, elapsed, blocked_for = row
+        if blocked_for > 0:
+            return tokens, rate, capacity, reserve, blocked_for
+        rate = min(max_rate, rate + elapsed * max_rate / RATE_RECOVERY_SECONDS)
+        tokens = min(capacity, tokens + elapsed * rate)
+        return tokens, rate, capacity, reserve, 0.0
+
+    def _usable(self, tokens, capacity, reserve, priority):
+        if priority == PRIORITY_BACKGROUND:
+            return tokens - capacity * reserve
+        return tokens
+
+    def try_acquire(self, priority):
+        """
+        Take one token without blocking.
+        Return 0 when the call may be sent, else the number of seconds to wait.
+        """
+        def _try(cr):
+            state = self._refill(cr)
+            if state is None:
+                return 0.0
+            tokens, rate, capacity, reserve, blocked_for = state
+            if blocked_for > 0:
+                return blocked_for
+            usable = self._usable(tokens, capacity, reserve, priority)
+            wait = 0.0
+            if usable >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - usable) / max(rate, 0.001)
+            cr.execute(
+                f"UPDATE mollie_rate_limit SET tokens = %s, rate = %s, updated_at = {_NOW} WHERE key = %s",
+                (tokens, rate, self.key),
+            )
+            return wait
+
+        return self._guard(_try, 0.0)
+
+    def acquire(self, priority, max_wait):
+        """
+        Wait (at most ``max_wait`` seconds) for a token.
+        Return 0 once a token was taken, else the remaining wait when giving up.
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.try_acquire(priority)
+            if not wait:
+                return 0.0
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                return wait
+            time.sleep(wait)
+
+    def available(self, priority):
+        """Tokens ``priority`` could use right now (0 while the bucket is paused); consumes nothing."""
+        def _available(cr):
+            state = self._refill(cr, lock=False)
+            if state is None:
+                return float("inf")
+            tokens, _rate, capacity, reserve, blocked_for = state
+            if blocked_for > 0:
+                return 0.0
+            return max(self._usable(tokens, capacity, reserve, priority), 0.0)
+
+        return self._guard(_available, float("inf"))
+
+    def throttle(self, retry_after=None):
+        """Mollie answered 429: pause the bucket for every worker and halve its rate."""
+        retry_after = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+        self._guard(lambda cr: cr.execute(
+            f"""
+            UPDATE mollie_rate_limit SET
+                rate = CASE WHEN blocked_until > {_NOW} THEN rate
+                            ELSE GREATEST(max_rate * %(min_ratio)s, rate / 2) END,
+                tokens = 0,
+                updated_at = {_NOW},
+                blocked_until = GREATEST(
+                    COALESCE(blocked_until, {_NOW}),
+                    {_NOW} + make_interval(secs => %(retry_after)s)
+                )
+            WHERE key = %(key)s
+            """,
+            {"key": self.key, "min_ratio": MIN_RATE_RATIO, "retry_after": float(retry_after)},
+        ), None)
+
+    def observe_headers(self, headers):
+        """Align the bucket on the rate-limit headers of a response, when Mollie sends them."""
+        remaining = _header_number(headers, "RateLimit-Remaining", "X-RateLimit-Remaining")
+        if remaining is None:
+            return
+        if remaining <= 0:
+            reset = _header_number(headers, "RateLimit-Reset", "X-RateLimit-Reset")
+            if reset is not None and reset > 1e9:
+                # Epoch timestamp instead of a delay
+                reset -= time.time()
+            self.throttle(max(reset, 1) if reset is not None else None)
+            return
+        if self._config and remaining >= self._config[1]:
+            return
+        self._guard(lambda cr: cr.execute(
+            "UPDATE mollie_rate_limit SET tokens = LEAST(tokens, %s) WHERE key = %s",
+            (remaining, self.key),
+        ), None)